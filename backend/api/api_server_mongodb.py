@@ -5,21 +5,23 @@ All predictions are saved to MongoDB with user mapping
 """
 from fastapi import FastAPI, HTTPException, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
-import joblib
 import numpy as np
 import pandas as pd
 import os
-from collections import Counter
 import httpx
 import asyncio
 from datetime import datetime
 from typing import Optional, List
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import traceback
 import sys
+import json
+from bson import ObjectId
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.gemini_service import (
     generate_crop_notification,
@@ -29,24 +31,114 @@ from utils.gemini_service import (
     generate_fertilizer_detailed_report,
     generate_yield_detailed_report
 )
+from utils.tabular_inference import (
+    MODEL_FILES,
+    MODEL_INPUT_FIELDS,
+    load_models,
+    run_crop_inference,
+    run_fertilizer_inference,
+    run_yield_inference
+)
+from utils.inference_executor import InferenceExecutor, ExecutorSaturated
+from utils.micro_batcher import MicroBatcher
+from utils.prediction_cache import PredictionCache, connect_redis
+from utils.mongo_client import connect_mongo
+from utils.mongo_indexes import provision_indexes
+from utils.write_behind import WriteBehindWriter
+from utils.history_cache import RecentHistoryCache
+from utils.history_query import HISTORY_COLLECTIONS, history_pipeline, encode_cursor, decode_cursor
 
 # Load environment variables
 load_dotenv()
 
+# Upper bound on rows accepted by the batch prediction endpoints
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "10000"))
+
+# Prediction cache: inputs are rounded to TABULAR_CACHE_PRECISION decimals before keying;
+# TABULAR_CACHE_MAX_ENTRIES=0 disables it, TABULAR_CACHE_REDIS_URL adds a shared store
+TABULAR_CACHE_PRECISION = int(os.getenv("TABULAR_CACHE_PRECISION", "1"))
+TABULAR_CACHE_MAX_ENTRIES = int(os.getenv("TABULAR_CACHE_MAX_ENTRIES", "4096"))
+TABULAR_CACHE_TTL_SECONDS = float(os.getenv("TABULAR_CACHE_TTL_SECONDS", "3600"))
+TABULAR_CACHE_REDIS_URL = os.getenv("TABULAR_CACHE_REDIS_URL") or None
+
+# Create history/profile indexes at startup (needs createIndex permission)
+MONGODB_ENSURE_INDEXES = os.getenv("MONGODB_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+
+# Write-behind for prediction records: flushed every PERSIST_FLUSH_INTERVAL_MS or
+# PERSIST_BATCH_SIZE records; overflow and failed writes go to PERSIST_SPILL_PATH
+PERSIST_FLUSH_INTERVAL_MS = float(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "50"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "10000"))
+PERSIST_SPILL_PATH = os.getenv("PERSIST_SPILL_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "pending_predictions.jsonl"
+)
+
+# Recent predictions kept in memory per user and type for Gemini context and reports
+# (latest plus the five before it); HISTORY_CACHE_MAX_USERS bounds it LRU
+HISTORY_CACHE_DEPTH = int(os.getenv("HISTORY_CACHE_DEPTH", "6"))
+HISTORY_CACHE_MAX_USERS = int(os.getenv("HISTORY_CACHE_MAX_USERS", "10000"))
+# Gemini context is skipped when the history cannot be read within this time
+HISTORY_READ_TIMEOUT_MS = float(os.getenv("HISTORY_READ_TIMEOUT_MS", "300"))
+
+# disease_detection_service.py owns disease_predictions (and its write-behind queue and
+# history cache), so history deletes are forwarded there. Blank when that service is not
+# deployed: disease records are then deleted from MongoDB directly
+DISEASE_SERVICE_URL = os.getenv("DISEASE_SERVICE_URL", "http://localhost:8002").rstrip("/")
+DISEASE_SERVICE_TIMEOUT_SECONDS = float(os.getenv("DISEASE_SERVICE_TIMEOUT_SECONDS", "10"))
+
+# Largest page accepted by /api/user/prediction-history
+HISTORY_PAGE_MAX_SIZE = int(os.getenv("HISTORY_PAGE_MAX_SIZE", "200"))
+
 # MongoDB connection
 mongo_client = None
 db = None
+prediction_writer = None
+recent_history = None
 
 # Global model instances
 crop_model_data = None
 fertilizer_model_data = None
 yield_model_data = None
 
+# Bounded pool that runs model inference off the event loop
+inference_executor = None
+
+# Micro-batchers coalescing concurrent single-sample requests per model
+crop_batcher = None
+fertilizer_batcher = None
+yield_batcher = None
+
+# Per-model prediction caches (None when disabled or the model is missing)
+crop_cache = None
+fertilizer_cache = None
+yield_cache = None
+cache_redis = None
+
+async def run_crop_batch(rows: list) -> list:
+    """Micro-batch callback: one crop ensemble pass over the stacked feature rows"""
+    recommended_crops, confidence, alternatives = await inference_executor.run(
+        run_crop_inference, np.vstack(rows)
+    )
+    return list(zip(recommended_crops, confidence, alternatives))
+
+async def run_fertilizer_batch(rows: list) -> list:
+    """Micro-batch callback: one fertilizer ensemble pass over the queued request dicts"""
+    recommended_fertilizers, confidence = await inference_executor.run(
+        run_fertilizer_inference, pd.DataFrame(rows)
+    )
+    return list(zip(recommended_fertilizers, confidence))
+
+async def run_yield_batch(rows: list) -> list:
+    """Micro-batch callback: one yield ensemble pass over the queued request dicts"""
+    return list(await inference_executor.run(run_yield_inference, pd.DataFrame(rows)))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     global crop_model_data, fertilizer_model_data, yield_model_data
-    global mongo_client, db
+    global mongo_client, db, inference_executor, prediction_writer, recent_history
+    global crop_batcher, fertilizer_batcher, yield_batcher
+    global crop_cache, fertilizer_cache, yield_cache, cache_redis
     
     # Connect to MongoDB
     try:
@@ -54,24 +146,40 @@ async def lifespan(app: FastAPI):
         mongodb_db_name = os.getenv("MONGODB_DB_NAME", "farmwise_agricultural_ai")
         
         if mongodb_uri:
-            mongo_client = MongoClient(mongodb_uri)
-            db = mongo_client[mongodb_db_name]
-            # Test connection
-            mongo_client.server_info()
+            # Async driver: database round trips no longer block the event loop
+            mongo_client, db = await connect_mongo(
+                mongodb_uri,
+                mongodb_db_name,
+                ["user_profiles", "crop_predictions", "fertilizer_predictions", "yield_predictions"]
+            )
             print("✓ MongoDB connected successfully")
             print(f"  - Database: {mongodb_db_name}")
+            print("✓ MongoDB collections initialized")
             
-            # Create collections if they don't exist
-            if "user_profiles" not in db.list_collection_names():
-                db.create_collection("user_profiles")
-            if "crop_predictions" not in db.list_collection_names():
-                db.create_collection("crop_predictions")
-            if "fertilizer_predictions" not in db.list_collection_names():
-                db.create_collection("fertilizer_predictions")
-            if "yield_predictions" not in db.list_collection_names():
-                db.create_collection("yield_predictions")
+            if MONGODB_ENSURE_INDEXES:
+                await provision_indexes(
+                    db,
+                    ["crop_predictions", "fertilizer_predictions", "yield_predictions"],
+                    profiles=True
+                )
             
-            print("✓ MongoDB collections initialized")
+            prediction_writer = WriteBehindWriter(
+                db,
+                flush_interval_ms=PERSIST_FLUSH_INTERVAL_MS,
+                batch_size=PERSIST_BATCH_SIZE,
+                max_queue=PERSIST_QUEUE_SIZE,
+                spill_path=PERSIST_SPILL_PATH
+            )
+            prediction_writer.start()
+            # Disease predictions are written by the disease service, so they are not cached here
+            recent_history = RecentHistoryCache(
+                db,
+                ["crop_predictions", "fertilizer_predictions", "yield_predictions"],
+                depth=HISTORY_CACHE_DEPTH,
+                max_users=HISTORY_CACHE_MAX_USERS,
+                read_timeout_ms=HISTORY_READ_TIMEOUT_MS
+            )
+            print(f"✓ Write-behind enabled (flush every {PERSIST_FLUSH_INTERVAL_MS:g} ms or {PERSIST_BATCH_SIZE} records)")
         else:
             print("⚠ MongoDB URI not found in environment variables")
             print("  - Running without database persistence")
@@ -83,25 +191,82 @@ async def lifespan(app: FastAPI):
     models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
     
     try:
-        # Load crop recommendation model
-        crop_model_data = joblib.load(os.path.join(models_dir, 'crop_recommendation_ensemble.pkl'))
-        print("✓ Crop recommendation model loaded")
-        
-        # Load fertilizer recommendation model
-        fertilizer_model_data = joblib.load(os.path.join(models_dir, 'fertilizer_recommendation_ensemble.pkl'))
-        print("✓ Fertilizer recommendation model loaded")
-        
-        # Load yield prediction model
-        yield_model_data = joblib.load(os.path.join(models_dir, 'yield_prediction_ensemble.pkl'))
-        print("✓ Yield prediction model loaded")
+        loaded_models = load_models(models_dir)
+        crop_model_data = loaded_models.get("crop")
+        fertilizer_model_data = loaded_models.get("fertilizer")
+        yield_model_data = loaded_models.get("yield")
+        
+        for label, model_data in [
+            ("Crop recommendation", crop_model_data),
+            ("Fertilizer recommendation", fertilizer_model_data),
+            ("Yield prediction", yield_model_data)
+        ]:
+            if model_data is not None:
+                print(f"✓ {label} model loaded")
+            else:
+                print(f"⚠ {label} model not found in {models_dir}")
         
     except Exception as e:
         print(f"Error loading models: {e}")
         traceback.print_exc()
     
+    # Cache entries are tied to the exact model file that produced them
+    if TABULAR_CACHE_MAX_ENTRIES > 0:
+        if TABULAR_CACHE_REDIS_URL:
+            cache_redis = connect_redis(TABULAR_CACHE_REDIS_URL)
+        caches = {}
+        for kind, model_data in [
+            ("crop", crop_model_data),
+            ("fertilizer", fertilizer_model_data),
+            ("yield", yield_model_data)
+        ]:
+            if model_data is None:
+                continue
+            model_path = os.path.join(models_dir, MODEL_FILES[kind])
+            modified = int(os.path.getmtime(model_path)) if os.path.exists(model_path) else 0
+            caches[kind] = PredictionCache(
+                kind,
+                f"{MODEL_FILES[kind]}:{modified}",
+                precision=TABULAR_CACHE_PRECISION,
+                max_entries=TABULAR_CACHE_MAX_ENTRIES,
+                ttl_seconds=TABULAR_CACHE_TTL_SECONDS,
+                redis_client=cache_redis
+            )
+        crop_cache = caches.get("crop")
+        fertilizer_cache = caches.get("fertilizer")
+        yield_cache = caches.get("yield")
+        print(f"✓ Prediction cache enabled ({TABULAR_CACHE_MAX_ENTRIES} entries per model, "
+              f"{TABULAR_CACHE_PRECISION} decimals{', shared via Redis' if cache_redis else ''})")
+    
+    # Process workers load their own copy of the models through the initializer
+    inference_executor = InferenceExecutor.from_env(initializer=load_models, initargs=(models_dir,))
+    stats = inference_executor.stats()
+    print(f"✓ Inference executor ready ({stats['mode']} pool, {stats['workers']} workers, queue {stats['queue_depth']})")
+    
+    # One batch per executor worker may be in flight at a time
+    batcher_options = {
+        "max_batch_size": int(os.getenv("BATCH_MAX_SIZE", "32")),
+        "max_wait_ms": float(os.getenv("BATCH_MAX_WAIT_MS", "2")),
+        "max_concurrent_batches": inference_executor.max_workers,
+        # Batches never exceed the executor's cap, so the bound on waiting items sheds load
+        "max_pending_items": int(os.getenv("BATCH_MAX_PENDING", "256"))
+    }
+    crop_batcher = MicroBatcher("crop", run_crop_batch, **batcher_options)
+    fertilizer_batcher = MicroBatcher("fertilizer", run_fertilizer_batch, **batcher_options)
+    yield_batcher = MicroBatcher("yield", run_yield_batch, **batcher_options)
+    for batcher in (crop_batcher, fertilizer_batcher, yield_batcher):
+        batcher.start()
+    
     yield
     
     # Shutdown
+    for batcher in (crop_batcher, fertilizer_batcher, yield_batcher):
+        await batcher.close()
+    inference_executor.shutdown()
+    if cache_redis is not None:
+        await cache_redis.aclose()
+    if prediction_writer is not None:
+        await prediction_writer.close()
     if mongo_client:
         mongo_client.close()
         print("✓ MongoDB connection closed")
@@ -128,6 +293,9 @@ class CropRecommendationRequest(BaseModel):
     rainfall: float
     userId: Optional[str] = "guest_user"  # Default to guest_user if not provided
 
+class CropBatchRequest(BaseModel):
+    samples: List[CropRecommendationRequest]
+
 class FertilizerRecommendationRequest(BaseModel):
     temperature: float
     humidity: float
@@ -141,6 +309,9 @@ class FertilizerRecommendationRequest(BaseModel):
     prediction_date: Optional[str] = None  # Date when prediction is made
     timeframe: Optional[str] = None  # Expected timeframe for results (e.g., "1 month", "3 months")
 
+class FertilizerBatchRequest(BaseModel):
+    samples: List[FertilizerRecommendationRequest]
+
 class YieldPredictionRequest(BaseModel):
     crop: str
     season: str
@@ -154,6 +325,9 @@ class YieldPredictionRequest(BaseModel):
     prediction_date: Optional[str] = None  # Date when prediction is made
     timeframe: Optional[str] = None  # Expected timeframe for harvest (e.g., "3 months", "6 months")
 
+class YieldBatchRequest(BaseModel):
+    samples: List[YieldPredictionRequest]
+
 class UserProfile(BaseModel):
     userId: str
     name: Optional[str] = ""
@@ -172,10 +346,14 @@ async def root():
         "database": "MongoDB" if db is not None else "In-Memory",
         "available_endpoints": [
             "/api/predict-crop",
+            "/api/predict-crop/batch",
             "/api/predict-fertilizer",
+            "/api/predict-fertilizer/batch",
             "/api/predict-yield",
+            "/api/predict-yield/batch",
             "/api/user/profile",
             "/api/user/prediction-history",
+            "/metrics",
             "/api/generate-detailed-report"
         ]
     }
@@ -192,363 +370,470 @@ async def health_check():
         "database": {
             "connected": db is not None,
             "type": "MongoDB" if db is not None else "In-Memory"
+        },
+        "inference": inference_executor.stats() if inference_executor else None
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Inference executor load, micro-batching histograms, write-behind queue and cache hit ratios"""
+    return {
+        "inference": inference_executor.stats() if inference_executor else None,
+        "persistence": prediction_writer.stats() if prediction_writer is not None else None,
+        "history_cache": recent_history.stats() if recent_history is not None else None,
+        "cache": {
+            cache.name: cache.stats()
+            for cache in (crop_cache, fertilizer_cache, yield_cache)
+            if cache is not None
+        },
+        "batching": {
+            batcher.name: batcher.stats()
+            for batcher in (crop_batcher, fertilizer_batcher, yield_batcher)
+            if batcher is not None
+        }
+    }
+
+async def run_inference(fn, *args):
+    """Await a model call on the inference executor, shedding load with 503 when it is saturated"""
+    try:
+        return await inference_executor.run(fn, *args)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+async def run_batched(batcher: MicroBatcher, item):
+    """Submit one sample to a micro-batcher, shedding load with 503 when the executor is saturated"""
+    try:
+        return await batcher.submit(item)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def cache_inputs(cache: PredictionCache, sample: BaseModel) -> dict:
+    """The request fields the cached model reads; userId, dates and unused readings are left out"""
+    return {field: getattr(sample, field) for field in MODEL_INPUT_FIELDS[cache.name]}
+
+async def cache_lookup(cache: Optional[PredictionCache], endpoint: str, samples: List[BaseModel]) -> list:
+    """Cached model outputs for each sample, None where there is no entry"""
+    if cache is None:
+        return [None] * len(samples)
+    return await cache.get_many([cache.key(cache_inputs(cache, sample)) for sample in samples], endpoint)
+
+async def cache_store(cache: Optional[PredictionCache], samples: List[BaseModel], outputs: list):
+    if cache is not None:
+        await cache.set_many([cache.key(cache_inputs(cache, sample)) for sample in samples], outputs)
+
+async def save_and_notify(collection_name: str, prediction_record: dict, generate_notification, label: str):
+    """
+    Queue the new prediction on the write-behind buffer, then ask Gemini for a
+    notification with the previous predictions from the history cache as context.
+    The blocking Gemini call runs in a worker thread; returns None on failure
+    """
+    # Queued (or spilled) before anything that can wait on MongoDB
+    prediction_writer.submit(collection_name, [prediction_record])
+    print(f"✓ {label} prediction queued for user: {prediction_record['userId']}")
+    
+    user_id = prediction_record["userId"]
+    previous_predictions = await recent_history.context(collection_name, user_id, limit=5)
+    recent_history.add(collection_name, user_id, [prediction_record])
+    
+    try:
+        # Generate AI notification
+        return await run_in_threadpool(generate_notification, prediction_record, previous_predictions)
+    except Exception as e:
+        print(f"⚠ Failed to generate notification: {e}")
+        return None
+
+async def save_batch(collection_name: str, records: List[dict], label: str):
+    """Queue batch endpoint records; they are bulk inserted by the write-behind flusher"""
+    try:
+        if records:
+            prediction_writer.submit(collection_name, records)
+            for record in records:
+                recent_history.add(collection_name, record.get("userId"), [record])
+            print(f"✓ {len(records)} {label} predictions queued from batch")
+    except Exception as e:
+        print(f"⚠ Failed to save batch predictions: {e}")
+
+def crop_feature_matrix(samples: List[CropRecommendationRequest]) -> np.ndarray:
+    """Stack soil readings into an (n, 7) matrix in the scaler's column order"""
+    return np.array([
+        [s.N, s.P, s.K, s.temperature, s.humidity, s.ph, s.rainfall]
+        for s in samples
+    ], dtype=float)
+
+def build_crop_result(request: CropRecommendationRequest, recommended_crop, confidence, alternatives) -> dict:
+    """Build the response payload for one crop recommendation"""
+    return {
+        "success": True,
+        "recommended_crop": str(recommended_crop),
+        "confidence": round(float(confidence), 2),
+        "alternatives": alternatives,
+        "soil_analysis": {
+            "nitrogen": request.N,
+            "phosphorus": request.P,
+            "potassium": request.K,
+            "ph": request.ph
+        },
+        "environmental_conditions": {
+            "temperature": request.temperature,
+            "humidity": request.humidity,
+            "rainfall": request.rainfall
         }
     }
 
+def crop_prediction_record(request: CropRecommendationRequest, result: dict) -> dict:
+    """Build the MongoDB document stored for one crop recommendation"""
+    return {
+        "userId": request.userId,
+        "predictionType": "crop_recommendation",
+        "timestamp": datetime.utcnow(),
+        "input": {
+            "N": request.N,
+            "P": request.P,
+            "K": request.K,
+            "temperature": request.temperature,
+            "humidity": request.humidity,
+            "ph": request.ph,
+            "rainfall": request.rainfall
+        },
+        # Own copy: the handler adds "notification" to the response dict afterwards
+        "result": dict(result)
+    }
+
 @app.post("/api/predict-crop")
 async def predict_crop(request: CropRecommendationRequest):
     try:
         if crop_model_data is None:
             raise HTTPException(status_code=503, detail="Crop model not loaded")
         
-        # Extract components
-        scaler = crop_model_data['scaler']
-        label_encoder = crop_model_data['label_encoder']
-        base_models = crop_model_data['base_models']
-        meta_model = crop_model_data['meta_model']
-        
-        # Prepare input features
-        features = np.array([[
-            request.N, request.P, request.K,
-            request.temperature, request.humidity,
-            request.ph, request.rainfall
-        ]])
-        
-        # Scale features
-        features_scaled = scaler.transform(features)
-        
-        # Get base model predictions
-        base_predictions = []
-        base_predictions_list = []
-        for name, model in base_models.items():
-            pred = model.predict(features_scaled)
-            base_predictions.append(pred[0])
-            base_predictions_list.append(pred)
-        
-        # Prepare meta features
-        meta_features = np.column_stack(base_predictions_list)
-        
-        # Final prediction
-        final_prediction = meta_model.predict(meta_features)[0]
-        
-        # Decode crop name
-        recommended_crop = label_encoder.inverse_transform([final_prediction])[0]
-        
-        # Calculate confidence from base models
-        prediction_counts = Counter(base_predictions)
-        most_common = prediction_counts.most_common()
-        confidence = most_common[0][1] / len(base_predictions) * 100
-        
-        # Get top 3 alternatives
-        alternatives = []
-        for crop_encoded, count in most_common[1:4]:
-            try:
-                crop_name = label_encoder.inverse_transform([crop_encoded])[0]
-                alternatives.append({
-                    "crop": crop_name,
-                    "confidence": round(count / len(base_predictions) * 100, 2)
-                })
-            except:
-                pass
-        
-        result = {
-            "success": True,
-            "recommended_crop": recommended_crop,
-            "confidence": round(confidence, 2),
-            "alternatives": alternatives,
-            "soil_analysis": {
-                "nitrogen": request.N,
-                "phosphorus": request.P,
-                "potassium": request.K,
-                "ph": request.ph
-            },
-            "environmental_conditions": {
-                "temperature": request.temperature,
-                "humidity": request.humidity,
-                "rainfall": request.rainfall
-            }
-        }
+        output = (await cache_lookup(crop_cache, "predict-crop", [request]))[0]
+        if output is None:
+            # Coalesce with concurrent requests into one ensemble pass
+            recommended_crop, confidence, alternatives = await run_batched(
+                crop_batcher, crop_feature_matrix([request])
+            )
+            output = [str(recommended_crop), float(confidence), alternatives]
+            await cache_store(crop_cache, [request], [output])
+        result = build_crop_result(request, *output)
         
         # Save to MongoDB and generate notification if userId provided and db connected
-        notification_message = None
         if db is not None and request.userId:
-            try:
-                prediction_record = {
-                    "userId": request.userId,
-                    "predictionType": "crop_recommendation",
-                    "timestamp": datetime.utcnow(),
-                    "input": {
-                        "N": request.N,
-                        "P": request.P,
-                        "K": request.K,
-                        "temperature": request.temperature,
-                        "humidity": request.humidity,
-                        "ph": request.ph,
-                        "rainfall": request.rainfall
-                    },
-                    "result": result
-                }
-                db.crop_predictions.insert_one(prediction_record)
-                print(f"✓ Crop prediction saved for user: {request.userId}")
-                
-                # Fetch previous predictions for context
-                previous_predictions = list(db.crop_predictions.find(
-                    {"userId": request.userId},
-                    {"_id": 0}
-                ).sort("timestamp", -1).skip(1).limit(5))
-                
-                # Generate AI notification
-                notification_message = generate_crop_notification(
-                    prediction_record,
-                    previous_predictions
-                )
+            prediction_record = crop_prediction_record(request, result)
+            notification_message = await save_and_notify(
+                "crop_predictions", prediction_record, generate_crop_notification, "Crop"
+            )
+            if notification_message is not None:
                 result["notification"] = notification_message
-                
-            except Exception as e:
-                print(f"⚠ Failed to save prediction or generate notification: {e}")
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/predict-crop/batch")
+async def predict_crop_batch_endpoint(request: CropBatchRequest):
+    """
+    Recommend crops for many soil samples in one vectorized ensemble pass
+    Results are returned in input order; records are saved with a single bulk insert
+    and no per-sample Gemini notification is generated
+    """
+    try:
+        if crop_model_data is None:
+            raise HTTPException(status_code=503, detail="Crop model not loaded")
+        
+        samples = request.samples
+        if not samples:
+            return {"success": True, "count": 0, "results": []}
+        if len(samples) > MAX_BATCH_ROWS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} samples")
+        
+        # Only samples without a cached prediction go through the ensemble
+        outputs = await cache_lookup(crop_cache, "predict-crop/batch", samples)
+        misses = [i for i, output in enumerate(outputs) if output is None]
+        if misses:
+            recommended_crops, confidence, alternatives = await run_inference(
+                run_crop_inference, crop_feature_matrix([samples[i] for i in misses])
+            )
+            for j, i in enumerate(misses):
+                outputs[i] = [str(recommended_crops[j]), float(confidence[j]), alternatives[j]]
+            await cache_store(crop_cache, [samples[i] for i in misses], [outputs[i] for i in misses])
+        results = [
+            build_crop_result(sample, *outputs[i])
+            for i, sample in enumerate(samples)
+        ]
+        
+        # Queue all predictions for one bulk write
+        if db is not None:
+            records = [
+                crop_prediction_record(sample, result)
+                for sample, result in zip(samples, results)
+                if sample.userId
+            ]
+            await save_batch("crop_predictions", records, "crop")
+        
+        return {
+            "success": True,
+            "count": len(results),
+            "results": results
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+def samples_to_frame(samples: List[BaseModel]) -> pd.DataFrame:
+    """Turn parsed request models into one DataFrame so features can be built column-wise"""
+    return pd.DataFrame([sample.dict() for sample in samples])
+
+def build_fertilizer_result(request: FertilizerRecommendationRequest, recommended_fertilizer, confidence) -> dict:
+    """Build the response payload for one fertilizer recommendation"""
+    return {
+        "success": True,
+        "recommended_fertilizer": str(recommended_fertilizer),
+        "confidence": round(float(confidence), 2),
+        "npk_values": {
+            "nitrogen": request.nitrogen,
+            "phosphorous": request.phosphorous,
+            "potassium": request.potassium
+        },
+        "soil_conditions": {
+            "soil_type": request.soil_type,
+            "moisture": request.moisture,
+            "temperature": request.temperature,
+            "humidity": request.humidity
+        },
+        "crop_type": request.crop_type
+    }
+
+def fertilizer_prediction_record(request: FertilizerRecommendationRequest, result: dict) -> dict:
+    """Build the MongoDB document stored for one fertilizer recommendation"""
+    return {
+        "userId": request.userId,
+        "predictionType": "fertilizer_recommendation",
+        "timestamp": datetime.utcnow(),
+        "prediction_date": request.prediction_date,
+        "timeframe": request.timeframe,
+        "input": {
+            "temperature": request.temperature,
+            "humidity": request.humidity,
+            "moisture": request.moisture,
+            "soil_type": request.soil_type,
+            "crop_type": request.crop_type,
+            "nitrogen": request.nitrogen,
+            "phosphorous": request.phosphorous,
+            "potassium": request.potassium
+        },
+        # Own copy: the handler adds "notification" to the response dict afterwards
+        "result": dict(result)
+    }
+
 @app.post("/api/predict-fertilizer")
 async def predict_fertilizer(request: FertilizerRecommendationRequest):
     try:
         if fertilizer_model_data is None:
             raise HTTPException(status_code=503, detail="Fertilizer model not loaded")
         
-        # Extract components
-        scaler = fertilizer_model_data['scaler']
-        fertilizer_encoder = fertilizer_model_data['fertilizer_encoder']
-        base_models = fertilizer_model_data['base_models']
-        meta_model = fertilizer_model_data['meta_model']
-        
-        # Encode categorical features
-        soil_type_mapping = {"Sandy": 0, "Loamy": 1, "Black": 2, "Red": 3, "Clayey": 4}
-        crop_type_mapping = {
-            "Maize": 0, "Sugarcane": 1, "Cotton": 2, "Tobacco": 3, "Paddy": 4, 
-            "Barley": 5, "Wheat": 6, "Millets": 7, "Oil seeds": 8, "Pulses": 9, 
-            "Ground Nuts": 10
-        }
-        
-        soil_type_encoded = soil_type_mapping.get(request.soil_type, 0)
-        crop_type_encoded = crop_type_mapping.get(request.crop_type, 0)
-        
-        # Prepare input features
-        features = np.array([[
-            request.nitrogen, request.phosphorous, request.potassium,
-            7.0,  # pH - default value
-            200.0,  # Rainfall - default value
-            request.temperature,
-            crop_type_encoded,
-            soil_type_encoded
-        ]])
-        
-        # Scale only numerical features (first 6)
-        features_scaled = features.copy()
-        features_scaled[:, :6] = scaler.transform(features[:, :6])
-        
-        # Get base model predictions
-        base_predictions = []
-        base_predictions_list = []
-        for name, model in base_models.items():
-            pred = model.predict(features_scaled)
-            base_predictions.append(pred[0])
-            base_predictions_list.append(pred)
-        
-        # Prepare meta features
-        meta_features = np.column_stack(base_predictions_list)
-        
-        # Final prediction
-        final_prediction = meta_model.predict(meta_features)[0]
-        
-        # Decode fertilizer name
-        recommended_fertilizer = fertilizer_encoder.inverse_transform([final_prediction])[0]
-        
-        # Calculate confidence
-        prediction_counts = Counter(base_predictions)
-        most_common = prediction_counts.most_common()
-        confidence = most_common[0][1] / len(base_predictions) * 100
-        
-        result = {
-            "success": True,
-            "recommended_fertilizer": recommended_fertilizer,
-            "confidence": round(confidence, 2),
-            "npk_values": {
-                "nitrogen": request.nitrogen,
-                "phosphorous": request.phosphorous,
-                "potassium": request.potassium
-            },
-            "soil_conditions": {
-                "soil_type": request.soil_type,
-                "moisture": request.moisture,
-                "temperature": request.temperature,
-                "humidity": request.humidity
-            },
-            "crop_type": request.crop_type
-        }
+        output = (await cache_lookup(fertilizer_cache, "predict-fertilizer", [request]))[0]
+        if output is None:
+            # Coalesce with concurrent requests into one ensemble pass
+            recommended_fertilizer, confidence = await run_batched(fertilizer_batcher, request.dict())
+            output = [str(recommended_fertilizer), float(confidence)]
+            await cache_store(fertilizer_cache, [request], [output])
+        result = build_fertilizer_result(request, *output)
         
         # Save to MongoDB and generate notification if userId provided and db connected
-        notification_message = None
         if db is not None and request.userId:
-            try:
-                prediction_record = {
-                    "userId": request.userId,
-                    "predictionType": "fertilizer_recommendation",
-                    "timestamp": datetime.utcnow(),
-                    "prediction_date": request.prediction_date,
-                    "timeframe": request.timeframe,
-                    "input": {
-                        "temperature": request.temperature,
-                        "humidity": request.humidity,
-                        "moisture": request.moisture,
-                        "soil_type": request.soil_type,
-                        "crop_type": request.crop_type,
-                        "nitrogen": request.nitrogen,
-                        "phosphorous": request.phosphorous,
-                        "potassium": request.potassium
-                    },
-                    "result": result
-                }
-                db.fertilizer_predictions.insert_one(prediction_record)
-                print(f"✓ Fertilizer prediction saved for user: {request.userId}")
-                
-                # Fetch previous predictions for context
-                previous_predictions = list(db.fertilizer_predictions.find(
-                    {"userId": request.userId},
-                    {"_id": 0}
-                ).sort("timestamp", -1).skip(1).limit(5))
-                
-                # Generate AI notification
-                notification_message = generate_fertilizer_notification(
-                    prediction_record,
-                    previous_predictions
-                )
+            prediction_record = fertilizer_prediction_record(request, result)
+            notification_message = await save_and_notify(
+                "fertilizer_predictions", prediction_record, generate_fertilizer_notification, "Fertilizer"
+            )
+            if notification_message is not None:
                 result["notification"] = notification_message
-                
-            except Exception as e:
-                print(f"⚠ Failed to save prediction or generate notification: {e}")
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/predict-fertilizer/batch")
+async def predict_fertilizer_batch_endpoint(request: FertilizerBatchRequest):
+    """
+    Recommend fertilizers for many plots in one vectorized ensemble pass
+    Categoricals are encoded column-wise and the scaled matrix is built without per-row work
+    """
+    try:
+        if fertilizer_model_data is None:
+            raise HTTPException(status_code=503, detail="Fertilizer model not loaded")
+        
+        samples = request.samples
+        if not samples:
+            return {"success": True, "count": 0, "results": []}
+        if len(samples) > MAX_BATCH_ROWS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} samples")
+        
+        # Only samples without a cached prediction go through the ensemble
+        outputs = await cache_lookup(fertilizer_cache, "predict-fertilizer/batch", samples)
+        misses = [i for i, output in enumerate(outputs) if output is None]
+        if misses:
+            recommended_fertilizers, confidence = await run_inference(
+                run_fertilizer_inference, samples_to_frame([samples[i] for i in misses])
+            )
+            for j, i in enumerate(misses):
+                outputs[i] = [str(recommended_fertilizers[j]), float(confidence[j])]
+            await cache_store(fertilizer_cache, [samples[i] for i in misses], [outputs[i] for i in misses])
+        results = [
+            build_fertilizer_result(sample, *outputs[i])
+            for i, sample in enumerate(samples)
+        ]
+        
+        # Queue all predictions for one bulk write
+        if db is not None:
+            records = [
+                fertilizer_prediction_record(sample, result)
+                for sample, result in zip(samples, results)
+                if sample.userId
+            ]
+            await save_batch("fertilizer_predictions", records, "fertilizer")
+        
+        return {
+            "success": True,
+            "count": len(results),
+            "results": results
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+def build_yield_result(request: YieldPredictionRequest, predicted_yield) -> dict:
+    """Build the response payload for one yield prediction"""
+    return {
+        "success": True,
+        "predicted_yield": round(float(predicted_yield), 2),
+        "yield_unit": "tonnes per hectare",
+        "input_parameters": {
+            "crop": request.crop,
+            "season": request.season,
+            "state": request.state,
+            "area": request.area,
+            "annual_rainfall": request.annual_rainfall,
+            "fertilizer": request.fertilizer,
+            "pesticide": request.pesticide
+        }
+    }
+
+def yield_prediction_record(request: YieldPredictionRequest, result: dict) -> dict:
+    """Build the MongoDB document stored for one yield prediction"""
+    return {
+        "userId": request.userId,
+        "predictionType": "yield_prediction",
+        "timestamp": datetime.utcnow(),
+        "prediction_date": request.prediction_date,
+        "timeframe": request.timeframe,
+        "input": {
+            "crop": request.crop,
+            "season": request.season,
+            "state": request.state,
+            "area": request.area,
+            "production": request.production,
+            "annual_rainfall": request.annual_rainfall,
+            "fertilizer": request.fertilizer,
+            "pesticide": request.pesticide
+        },
+        # Own copy: the handler adds "notification" to the response dict afterwards
+        "result": dict(result)
+    }
+
 @app.post("/api/predict-yield")
 async def predict_yield(request: YieldPredictionRequest):
     try:
         if yield_model_data is None:
             raise HTTPException(status_code=503, detail="Yield model not loaded")
         
-        # Extract components
-        scaler = yield_model_data['scaler']
-        base_models = yield_model_data['base_models']
-        meta_model = yield_model_data['meta_model']
-        
-        # Encode categorical features
-        crop_mapping = {"Rice": 0, "Wheat": 1, "Maize": 2, "Sugarcane": 3, "Cotton": 4}
-        season_mapping = {"Kharif": 0, "Rabi": 1, "Summer": 2, "Whole Year": 3}
-        state_mapping = {
-            "Andhra Pradesh": 0, "Karnataka": 1, "Maharashtra": 2, "Tamil Nadu": 3,
-            "Uttar Pradesh": 4, "West Bengal": 5, "Gujarat": 6, "Madhya Pradesh": 7,
-            "Punjab": 8, "Haryana": 9
-        }
-        
-        crop_encoded = crop_mapping.get(request.crop, 0)
-        season_encoded = season_mapping.get(request.season, 0)
-        state_encoded = state_mapping.get(request.state, 0)
-        
-        # Prepare input features
-        numerical_features = np.array([[
-            request.area, request.annual_rainfall, request.fertilizer, request.pesticide
-        ]])
+        predicted_yield = (await cache_lookup(yield_cache, "predict-yield", [request]))[0]
+        if predicted_yield is None:
+            # Coalesce with concurrent requests into one ensemble pass
+            predicted_yield = float(await run_batched(yield_batcher, request.dict()))
+            await cache_store(yield_cache, [request], [predicted_yield])
+        result = build_yield_result(request, predicted_yield)
         
-        # Scale only numerical features
-        numerical_scaled = scaler.transform(numerical_features)
+        # Save to MongoDB and generate notification if userId provided and db connected
+        if db is not None and request.userId:
+            prediction_record = yield_prediction_record(request, result)
+            notification_message = await save_and_notify(
+                "yield_predictions", prediction_record, generate_yield_notification, "Yield"
+            )
+            if notification_message is not None:
+                result["notification"] = notification_message
         
-        # Combine scaled numerical with encoded categorical
-        features_scaled = np.concatenate([
-            numerical_scaled,
-            [[crop_encoded, state_encoded, season_encoded]]
-        ], axis=1)
+        return result
         
-        # Get base model predictions
-        base_predictions = []
-        base_predictions_list = []
-        for name, model in base_models.items():
-            pred = model.predict(features_scaled)
-            base_predictions.append(pred[0])
-            base_predictions_list.append(pred)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/predict-yield/batch")
+async def predict_yield_batch_endpoint(request: YieldBatchRequest):
+    """
+    Predict yields for many plots in one vectorized ensemble pass
+    Categoricals are encoded column-wise and the scaled matrix is built without per-row work
+    """
+    try:
+        if yield_model_data is None:
+            raise HTTPException(status_code=503, detail="Yield model not loaded")
         
-        # Prepare meta features
-        meta_features = np.column_stack(base_predictions_list)
+        samples = request.samples
+        if not samples:
+            return {"success": True, "count": 0, "results": []}
+        if len(samples) > MAX_BATCH_ROWS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} samples")
+        
+        # Only samples without a cached prediction go through the ensemble
+        predicted_yields = await cache_lookup(yield_cache, "predict-yield/batch", samples)
+        misses = [i for i, predicted in enumerate(predicted_yields) if predicted is None]
+        if misses:
+            computed = await run_inference(run_yield_inference, samples_to_frame([samples[i] for i in misses]))
+            for j, i in enumerate(misses):
+                predicted_yields[i] = float(computed[j])
+            await cache_store(yield_cache, [samples[i] for i in misses], [predicted_yields[i] for i in misses])
+        results = [
+            build_yield_result(sample, predicted_yields[i])
+            for i, sample in enumerate(samples)
+        ]
         
-        # Final prediction
-        predicted_yield = meta_model.predict(meta_features)[0]
+        # Queue all predictions for one bulk write
+        if db is not None:
+            records = [
+                yield_prediction_record(sample, result)
+                for sample, result in zip(samples, results)
+                if sample.userId
+            ]
+            await save_batch("yield_predictions", records, "yield")
         
-        result = {
+        return {
             "success": True,
-            "predicted_yield": round(float(predicted_yield), 2),
-            "yield_unit": "tonnes per hectare",
-            "input_parameters": {
-                "crop": request.crop,
-                "season": request.season,
-                "state": request.state,
-                "area": request.area,
-                "annual_rainfall": request.annual_rainfall,
-                "fertilizer": request.fertilizer,
-                "pesticide": request.pesticide
-            }
+            "count": len(results),
+            "results": results
         }
         
-        # Save to MongoDB and generate notification if userId provided and db connected
-        notification_message = None
-        if db is not None and request.userId:
-            try:
-                prediction_record = {
-                    "userId": request.userId,
-                    "predictionType": "yield_prediction",
-                    "timestamp": datetime.utcnow(),
-                    "prediction_date": request.prediction_date,
-                    "timeframe": request.timeframe,
-                    "input": {
-                        "crop": request.crop,
-                        "season": request.season,
-                        "state": request.state,
-                        "area": request.area,
-                        "production": request.production,
-                        "annual_rainfall": request.annual_rainfall,
-                        "fertilizer": request.fertilizer,
-                        "pesticide": request.pesticide
-                    },
-                    "result": result
-                }
-                db.yield_predictions.insert_one(prediction_record)
-                print(f"✓ Yield prediction saved for user: {request.userId}")
-                
-                # Fetch previous predictions for context
-                previous_predictions = list(db.yield_predictions.find(
-                    {"userId": request.userId},
-                    {"_id": 0}
-                ).sort("timestamp", -1).skip(1).limit(5))
-                
-                # Generate AI notification
-                notification_message = generate_yield_notification(
-                    prediction_record,
-                    previous_predictions
-                )
-                result["notification"] = notification_message
-                
-            except Exception as e:
-                print(f"⚠ Failed to save prediction or generate notification: {e}")
-        
-        return result
-        
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -562,7 +847,7 @@ async def get_profile(userId: str):
         if db is None:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        profile = db.user_profiles.find_one({"userId": userId}, {"_id": 0})
+        profile = await db.user_profiles.find_one({"userId": userId}, {"_id": 0})
         
         if not profile:
             raise HTTPException(status_code=404, detail="Profile not found")
@@ -582,7 +867,7 @@ async def create_profile(profile: UserProfile):
             raise HTTPException(status_code=503, detail="Database not connected")
         
         # Check if profile already exists
-        existing = db.user_profiles.find_one({"userId": profile.userId})
+        existing = await db.user_profiles.find_one({"userId": profile.userId})
         if existing:
             raise HTTPException(status_code=400, detail="Profile already exists. Use PUT to update.")
         
@@ -590,7 +875,7 @@ async def create_profile(profile: UserProfile):
         profile_dict["createdAt"] = datetime.utcnow()
         profile_dict["updatedAt"] = datetime.utcnow()
         
-        db.user_profiles.insert_one(profile_dict)
+        await db.user_profiles.insert_one(profile_dict)
         
         return {
             "success": True,
@@ -613,7 +898,7 @@ async def update_profile(profile: UserProfile):
         profile_dict = profile.dict()
         profile_dict["updatedAt"] = datetime.utcnow()
         
-        result = db.user_profiles.update_one(
+        result = await db.user_profiles.update_one(
             {"userId": profile.userId},
             {"$set": profile_dict},
             upsert=True
@@ -628,70 +913,115 @@ async def update_profile(profile: UserProfile):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_history(user_id: str, first: Optional[dict], documents, page_size: int):
+    """
+    JSON body written item by item as the aggregation cursor yields documents;
+    next_cursor comes last because it is only known once the page is read
+    """
+    yield '{"userId": ' + json.dumps(user_id) + ', "predictions": ['
+    count = 0
+    last = None
+    next_cursor = None
+    document = first
+    try:
+        while document is not None:
+            if count == page_size:
+                # The extra document only signals that another page exists
+                next_cursor = encode_cursor(last["timestamp"], last["_id"])
+                break
+            item = jsonable_encoder(document, custom_encoder={ObjectId: str})
+            item["id"] = item.pop("_id")
+            yield ("," if count else "") + json.dumps(item)
+            count += 1
+            last = document
+            try:
+                document = await documents.next()
+            except StopAsyncIteration:
+                document = None
+    finally:
+        await documents.close()
+    yield '], "count": ' + str(count) + ', "next_cursor": ' + json.dumps(next_cursor) + '}'
+
 @app.get("/api/user/prediction-history")
-async def get_prediction_history(userId: str, predictionType: Optional[str] = None, limit: int = 50):
-    """Get user's prediction history from MongoDB"""
+async def get_prediction_history(userId: str, predictionType: Optional[str] = None, limit: int = 50,
+                                 cursor: Optional[str] = None):
+    """
+    Prediction history across all types (crop, fertilizer, yield, disease), newest first.
+    predictionType takes a comma-separated subset; pass next_cursor back as cursor for the next page
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    
+    prediction_types = (
+        [t.strip() for t in predictionType.split(",") if t.strip()] if predictionType else list(HISTORY_COLLECTIONS)
+    )
+    unknown = [t for t in prediction_types if t not in HISTORY_COLLECTIONS]
+    if unknown or not prediction_types:
+        raise HTTPException(status_code=400, detail=f"Invalid prediction type: {', '.join(unknown)}")
+    limit = max(1, min(limit, HISTORY_PAGE_MAX_SIZE))
     try:
-        if db is None:
-            raise HTTPException(status_code=503, detail="Database not connected")
-        
-        history = {
-            "userId": userId,
-            "crop_predictions": [],
-            "fertilizer_predictions": [],
-            "yield_predictions": []
-        }
-        
-        # Get crop predictions
-        if predictionType is None or predictionType == "crop":
-            crop_preds = list(db.crop_predictions.find(
-                {"userId": userId},
-                {"_id": 0}
-            ).sort("timestamp", -1).limit(limit))
-            history["crop_predictions"] = crop_preds
-        
-        # Get fertilizer predictions
-        if predictionType is None or predictionType == "fertilizer":
-            fert_preds = list(db.fertilizer_predictions.find(
-                {"userId": userId},
-                {"_id": 0}
-            ).sort("timestamp", -1).limit(limit))
-            history["fertilizer_predictions"] = fert_preds
-        
-        # Get yield predictions
-        if predictionType is None or predictionType == "yield":
-            yield_preds = list(db.yield_predictions.find(
-                {"userId": userId},
-                {"_id": 0}
-            ).sort("timestamp", -1).limit(limit))
-            history["yield_predictions"] = yield_preds
-        
-        return history
-        
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # One aggregation for all types; one extra item tells whether there is a next page
+    collection_name, pipeline = history_pipeline(userId, prediction_types, limit + 1, after)
+    try:
+        documents = db[collection_name].aggregate(pipeline, batchSize=limit + 1)
+        # Read the first document here so database errors still produce a 500
+        try:
+            first = await documents.next()
+        except StopAsyncIteration:
+            first = None
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return StreamingResponse(stream_history(userId, first, documents, limit), media_type="application/json")
 
 @app.delete("/api/user/prediction-history")
 async def delete_prediction_history(userId: str):
-    """Delete all prediction history for a user"""
+    """
+    Delete all prediction history for a user, across every type the history endpoint returns.
+    Disease history is deleted by the disease service (DISEASE_SERVICE_URL), which also drops
+    its own queued records and cache; if it cannot be reached nothing is deleted here (502)
+    """
     try:
         if db is None:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        crop_result = db.crop_predictions.delete_many({"userId": userId})
-        fert_result = db.fertilizer_predictions.delete_many({"userId": userId})
-        yield_result = db.yield_predictions.delete_many({"userId": userId})
+        deleted, dropped = {}, 0
+        collection_names = list(HISTORY_COLLECTIONS.values())
+        if DISEASE_SERVICE_URL:
+            try:
+                async with httpx.AsyncClient(timeout=DISEASE_SERVICE_TIMEOUT_SECONDS) as client:
+                    response = await client.delete(
+                        f"{DISEASE_SERVICE_URL}/api/user/prediction-history", params={"userId": userId}
+                    )
+                    response.raise_for_status()
+                    disease = response.json()
+            except httpx.HTTPError as e:
+                raise HTTPException(status_code=502, detail=f"Disease service could not delete history: {e}")
+            deleted.update(disease["deleted"])
+            dropped += disease["pending_dropped"]
+            collection_names = [name for name in collection_names if name not in deleted]
+        
+        # Queued or spilled records would otherwise be inserted after the delete
+        dropped += await prediction_writer.discard(userId)
+        results = await asyncio.gather(*[
+            db[name].delete_many({"userId": userId}) for name in collection_names
+        ])
+        deleted.update({name: result.deleted_count for name, result in zip(collection_names, results)})
+        recent_history.invalidate(userId)
         
         return {
             "success": True,
             "message": "Prediction history deleted",
-            "deleted": {
-                "crop_predictions": crop_result.deleted_count,
-                "fertilizer_predictions": fert_result.deleted_count,
-                "yield_predictions": yield_result.deleted_count
-            }
+            "deleted": {name: deleted[name] for name in HISTORY_COLLECTIONS.values()},
+            "pending_dropped": dropped
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -718,34 +1048,25 @@ async def generate_detailed_report(userId: str, predictionType: str):
             raise HTTPException(status_code=400, detail="Invalid prediction type")
         
         collection_name = collection_map[predictionType]
-        collection = db[collection_name]
         
-        # Get latest prediction
-        latest_prediction = collection.find_one(
-            {"userId": userId},
-            {"_id": 0},
-            sort=[("timestamp", -1)]
-        )
+        # Latest prediction and the previous ones, from the history cache when this service owns them
+        recent_predictions = await recent_history.recent(collection_name, userId, limit=6)
         
-        if not latest_prediction:
+        if not recent_predictions:
             raise HTTPException(status_code=404, detail="No predictions found for this user")
-        
-        # Get previous predictions
-        previous_predictions = list(collection.find(
-            {"userId": userId},
-            {"_id": 0}
-        ).sort("timestamp", -1).skip(1).limit(5))
+        latest_prediction, previous_predictions = recent_predictions[0], recent_predictions[1:]
         
         # Generate report based on type
         if predictionType == "crop":
-            report = generate_crop_detailed_report(latest_prediction, previous_predictions)
+            generate_report = generate_crop_detailed_report
         elif predictionType == "fertilizer":
-            report = generate_fertilizer_detailed_report(latest_prediction, previous_predictions)
+            generate_report = generate_fertilizer_detailed_report
         elif predictionType == "yield":
-            report = generate_yield_detailed_report(latest_prediction, previous_predictions)
+            generate_report = generate_yield_detailed_report
         elif predictionType == "disease":
             from utils.gemini_service import generate_disease_detailed_report
-            report = generate_disease_detailed_report(latest_prediction, previous_predictions)
+            generate_report = generate_disease_detailed_report
+        report = await run_in_threadpool(generate_report, latest_prediction, previous_predictions)
         
         return report
         
@@ -6,27 +6,180 @@ Integrated with MongoDB and Gemini AI for historical analysis
 """
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import tensorflow as tf
 from tensorflow import keras  # TensorFlow 2.18 has integrated Keras
 import numpy as np
 from PIL import Image
 import io
 import json
+import time
+import copy
+import hashlib
 import os
 import httpx
 from datetime import datetime
 import asyncio
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Optional, List
+from collections import Counter
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.micro_batcher import MicroBatcher
+from utils.disease_backends import (
+    KerasBackend, TFLiteBackend, convert_to_tflite, compare_backends, tflite_variant
+)
+from utils.result_cache import LRUCache
+from utils.http_client import ConnectionStats, create_async_client
+from utils.webhook_outbox import WebhookOutbox
+from utils.disease_index import build_disease_index, top_k
+from utils.mongo_client import connect_mongo
+from utils.mongo_indexes import provision_indexes
+from utils.write_behind import WriteBehindWriter
+from utils.history_cache import RecentHistoryCache
+from utils.body_limit import BodySizeLimitMiddleware
 
 load_dotenv()
 
-app = FastAPI(title="Disease Detection Service")
+# Dynamic batching: largest image batch per CNN call and how long (ms) a batch may
+# wait for more uploads while the model is busy - the per-request latency budget
+DISEASE_MAX_BATCH = int(os.getenv("DISEASE_MAX_BATCH", "16"))
+DISEASE_BATCH_WAIT_MS = float(os.getenv("DISEASE_BATCH_WAIT_MS", "5"))
+
+# Warm-up at startup: forward passes per batch bucket before /health reports ready
+DISEASE_WARMUP_ROUNDS = int(os.getenv("DISEASE_WARMUP_ROUNDS", "2"))
+
+# Inference backend: "keras" (float32 reference) or "tflite" (quantized copy cached on disk)
+DISEASE_BACKEND = os.getenv("DISEASE_BACKEND", "keras").lower()
+DISEASE_TFLITE_QUANTIZATION = os.getenv("DISEASE_TFLITE_QUANTIZATION", "float16").lower()
+DISEASE_TFLITE_CACHE_DIR = os.getenv("DISEASE_TFLITE_CACHE_DIR") or None
+# Labelled <class_name>/<image> folder used for int8 calibration and the accuracy report
+DISEASE_VALIDATION_DIR = os.getenv("DISEASE_VALIDATION_DIR") or None
+
+# Result cache for repeated uploads, keyed by image content hash and model version
+DISEASE_CACHE_MAX_ENTRIES = int(os.getenv("DISEASE_CACHE_MAX_ENTRIES", "1024"))
+DISEASE_CACHE_TTL_SECONDS = float(os.getenv("DISEASE_CACHE_TTL_SECONDS", "3600"))
+
+# Alternatives returned in top_predictions, and the probability (0-1) an alternative
+# needs to be listed; the top prediction is always returned
+DISEASE_TOP_K = int(os.getenv("DISEASE_TOP_K", "3"))
+DISEASE_MIN_CONFIDENCE = float(os.getenv("DISEASE_MIN_CONFIDENCE", "0"))
+
+# Treatment/prevention table (JSON); defaults to utils/disease_recommendations.json
+DISEASE_RECOMMENDATIONS_PATH = os.getenv("DISEASE_RECOMMENDATIONS_PATH") or None
+
+# Largest accepted image. The request body is capped before the multipart form is
+# parsed (image plus MULTIPART_OVERHEAD_BYTES for boundaries and form fields)
+DISEASE_MAX_UPLOAD_BYTES = int(os.getenv("DISEASE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Magic numbers of the image formats PIL can decode for us
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+
+# Most images, and most image bytes in total, accepted by one /api/detect-disease/batch request
+DISEASE_MAX_BATCH_FILES = int(os.getenv("DISEASE_MAX_BATCH_FILES", "64"))
+DISEASE_MAX_BATCH_BYTES = int(os.getenv("DISEASE_MAX_BATCH_BYTES", str(64 * 1024 * 1024)))
+
+# Ordering used to pick the worst severity in a plot
+SEVERITY_RANK = {"None": 0, "Low": 1, "Moderate": 2, "High": 3}
+
+# Threads for image decode/resize; PIL releases the GIL so this scales with cores
+DISEASE_DECODE_WORKERS = int(os.getenv("DISEASE_DECODE_WORKERS", str(os.cpu_count() or 1)))
+
+# Alert target. Unset WEBHOOK_BATCH_URL means one POST per alert; set it (e.g. to
+# WEBHOOK_URL + "/batch" on api/webhook_receiver.py) to send queued alerts as {"events": [...]}
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "http://localhost:5678/webhook-test/trigger-email-alert")
+WEBHOOK_BATCH_URL = os.getenv("WEBHOOK_BATCH_URL", "")
+
+# Durable outbox: alerts survive restarts and are retried with exponential backoff.
+# Unset or blank keeps it in backend/data regardless of the working directory
+WEBHOOK_OUTBOX_PATH = os.getenv("WEBHOOK_OUTBOX_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "webhook_outbox.db"
+)
+WEBHOOK_OUTBOX_BATCH_SIZE = int(os.getenv("WEBHOOK_OUTBOX_BATCH_SIZE", "50"))
+WEBHOOK_OUTBOX_LINGER_MS = float(os.getenv("WEBHOOK_OUTBOX_LINGER_MS", "250"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "1"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "300"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "20"))
+
+# Create the (userId, timestamp) history index at startup (needs createIndex permission)
+MONGODB_ENSURE_INDEXES = os.getenv("MONGODB_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+
+# Write-behind for prediction records; the spill file is separate from the tabular API's
+PERSIST_FLUSH_INTERVAL_MS = float(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "50"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "10000"))
+DISEASE_PERSIST_SPILL_PATH = os.getenv("DISEASE_PERSIST_SPILL_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "pending_disease_predictions.jsonl"
+)
+
+# Last predictions kept in memory per user for Gemini context, LRU over users
+HISTORY_CACHE_DEPTH = int(os.getenv("HISTORY_CACHE_DEPTH", "6"))
+HISTORY_CACHE_MAX_USERS = int(os.getenv("HISTORY_CACHE_MAX_USERS", "10000"))
+# Gemini context is skipped when the history cannot be read within this time
+HISTORY_READ_TIMEOUT_MS = float(os.getenv("HISTORY_READ_TIMEOUT_MS", "300"))
+
+# Pooled webhook client: connection limits, keep-alive and optional HTTP/2 (needs h2)
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "20"))
+WEBHOOK_MAX_KEEPALIVE = int(os.getenv("WEBHOOK_MAX_KEEPALIVE", "10"))
+WEBHOOK_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("WEBHOOK_KEEPALIVE_EXPIRY_SECONDS", "30"))
+WEBHOOK_HTTP2 = os.getenv("WEBHOOK_HTTP2", "false").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global webhook_client, webhook_outbox
+    # Startup
+    webhook_client = create_async_client(
+        timeout=WEBHOOK_TIMEOUT_SECONDS,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        max_keepalive=WEBHOOK_MAX_KEEPALIVE,
+        keepalive_expiry=WEBHOOK_KEEPALIVE_EXPIRY_SECONDS,
+        http2=WEBHOOK_HTTP2
+    )
+    webhook_outbox = WebhookOutbox(
+        WEBHOOK_OUTBOX_PATH,
+        deliver_webhook_batch,
+        batch_size=WEBHOOK_OUTBOX_BATCH_SIZE,
+        linger_ms=WEBHOOK_OUTBOX_LINGER_MS,
+        base_backoff=WEBHOOK_RETRY_BASE_SECONDS,
+        max_backoff=WEBHOOK_RETRY_MAX_SECONDS,
+        max_attempts=WEBHOOK_MAX_ATTEMPTS
+    )
+    await webhook_outbox.start()
+    print(f"✓ Webhook outbox at {WEBHOOK_OUTBOX_PATH} -> {WEBHOOK_BATCH_URL or WEBHOOK_URL}")
+    await load_disease_model()
+    
+    yield
+    
+    # Shutdown
+    await shutdown_disease_service()
+    await webhook_outbox.close()
+    await webhook_client.aclose()
+    webhook_client = None
+
+app = FastAPI(title="Disease Detection Service", lifespan=lifespan)
+
+# Reject oversized uploads before they are spooled to disk; added first so
+# CORS headers still wrap the 413
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/api/detect-disease": DISEASE_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/api/detect-disease/batch": DISEASE_MAX_BATCH_BYTES + MULTIPART_OVERHEAD_BYTES
+})
 
 # Enable CORS
 app.add_middleware(
@@ -40,8 +193,35 @@ app.add_middleware(
 # Global variables
 disease_model = None
 disease_classes = None
+disease_index = None
+disease_model_name = None
+disease_model_path = None
+inference_backend = None
+backend_report = None
+model_version = None
+# starting -> warming_up -> ready, or model_unavailable when no model loads
+service_status = "starting"
+warmup_seconds = None
+result_cache = LRUCache(DISEASE_CACHE_MAX_ENTRIES, DISEASE_CACHE_TTL_SECONDS)
+
+# (height, width) the loaded CNN expects; used when no size can be read from the model
+DEFAULT_INPUT_SIZE = (224, 224)
+model_input_size = DEFAULT_INPUT_SIZE
 mongo_client = None
 db = None
+prediction_writer = None
+recent_history = None
+
+# CNN calls run on one dedicated thread; TensorFlow parallelises inside each batch
+model_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disease-cnn")
+decode_pool = ThreadPoolExecutor(max_workers=DISEASE_DECODE_WORKERS, thread_name_prefix="disease-decode")
+disease_batcher = None
+batch_buffer = None
+# Held so the background warm-up is not garbage-collected and can be cancelled on shutdown
+warmup_task = None
+webhook_client = None
+webhook_outbox = None
+webhook_connection_stats = ConnectionStats()
 
 def get_default_disease_classes():
     """Return default disease classes for common plant diseases"""
@@ -81,9 +261,11 @@ def get_default_disease_classes():
     ]
 
 # Load model and connect to MongoDB on startup
-@app.on_event("startup")
 async def load_disease_model():
-    global disease_model, disease_classes, mongo_client, db
+    global disease_model, disease_classes, mongo_client, db, disease_batcher, batch_buffer
+    global prediction_writer, recent_history, warmup_task
+    global disease_model_name, disease_model_path, model_input_size
+    global inference_backend, backend_report, model_version, service_status, disease_index
     
     # Connect to MongoDB
     try:
@@ -91,16 +273,26 @@ async def load_disease_model():
         mongodb_db_name = os.getenv("MONGODB_DB_NAME", "farmwise_agricultural_ai")
         
         if mongodb_uri:
-            mongo_client = MongoClient(mongodb_uri)
-            db = mongo_client[mongodb_db_name]
-            mongo_client.server_info()  # Test connection
+            # Async driver; also creates disease_predictions if it doesn't exist
+            mongo_client, db = await connect_mongo(mongodb_uri, mongodb_db_name, ["disease_predictions"])
             print("✓ MongoDB connected successfully")
             print(f"  - Database: {mongodb_db_name}")
             
-            # Create disease_predictions collection if it doesn't exist
-            if "disease_predictions" not in db.list_collection_names():
-                db.create_collection("disease_predictions")
-                print("✓ disease_predictions collection created")
+            if MONGODB_ENSURE_INDEXES:
+                await provision_indexes(db, ["disease_predictions"])
+            
+            prediction_writer = WriteBehindWriter(
+                db,
+                flush_interval_ms=PERSIST_FLUSH_INTERVAL_MS,
+                batch_size=PERSIST_BATCH_SIZE,
+                max_queue=PERSIST_QUEUE_SIZE,
+                spill_path=DISEASE_PERSIST_SPILL_PATH
+            )
+            prediction_writer.start()
+            recent_history = RecentHistoryCache(
+                db, ["disease_predictions"], depth=HISTORY_CACHE_DEPTH, max_users=HISTORY_CACHE_MAX_USERS,
+                read_timeout_ms=HISTORY_READ_TIMEOUT_MS
+            )
         else:
             print("⚠ MongoDB URI not found - running without database")
     except Exception as e:
@@ -131,6 +323,10 @@ async def load_disease_model():
             print(f" Disease detection model loaded from {model_path}")
             print(f"  Model input shape: {disease_model.input_shape}")
             print(f"  Model output shape: {disease_model.output_shape}")
+            disease_model_path = model_path
+            disease_model_name = os.path.basename(model_path)
+            model_input_size = resolve_input_size(disease_model, model_path)
+            print(f"  Preprocessing at: {model_input_size[1]}x{model_input_size[0]}")
             
             # Load disease classes (prefer JSON from new model folder)
             if os.path.exists(class_names_path):
@@ -162,33 +358,220 @@ async def load_disease_model():
     if disease_model is None:
         print("! WARNING: No disease detection model could be loaded")
         disease_classes = get_default_disease_classes()
+        service_status = "model_unavailable"
+        return
+    
+    disease_index = build_disease_index(
+        disease_classes, disease_model.output_shape[-1], DISEASE_RECOMMENDATIONS_PATH
+    )
+    print(f" Indexed {len(disease_index)} classes with recommendations")
+    
+    inference_backend = KerasBackend(disease_model, input_size=model_input_size)
+    tflite_tag = None
+    if DISEASE_BACKEND == "tflite":
+        try:
+            tflite_tag = tflite_variant(DISEASE_TFLITE_QUANTIZATION, DISEASE_VALIDATION_DIR)
+            tflite_path = convert_to_tflite(
+                disease_model,
+                disease_model_path,
+                quantization=DISEASE_TFLITE_QUANTIZATION,
+                cache_dir=DISEASE_TFLITE_CACHE_DIR,
+                input_size=model_input_size,
+                calibration_dir=DISEASE_VALIDATION_DIR
+            )
+            # One allocated interpreter per batch bucket, so traffic never re-plans tensors
+            tflite_backend = TFLiteBackend(tflite_path, num_threads=os.cpu_count(), batch_sizes=batch_buckets())
+            print(f" Serving {tflite_tag} TFLite model from {tflite_path}")
+            
+            if DISEASE_VALIDATION_DIR:
+                backend_report = compare_backends(
+                    inference_backend, tflite_backend, DISEASE_VALIDATION_DIR,
+                    disease_classes, model_input_size
+                )
+                print(f" TFLite vs Keras on validation set: {backend_report}")
+            inference_backend = tflite_backend
+        except Exception as e:
+            print(f"! TFLite backend unavailable, serving Keras model: {e}")
+    
+    # Cached results are only valid for the exact model file and backend that produced them
+    model_version = f"{disease_model_name}:{int(os.path.getmtime(disease_model_path))}:{inference_backend.name}"
+    if inference_backend.name == "tflite":
+        # Includes the int8 calibration set, so recalibrating invalidates cached results
+        model_version += f":{tflite_tag}"
+    
+    # Reused input tensor, filled on the model thread; only one batch is in flight at a time
+    batch_buffer = np.empty((DISEASE_MAX_BATCH, *model_input_size, 3), dtype=np.float32)
+    disease_batcher = MicroBatcher(
+        "disease",
+        run_disease_batch,
+        max_batch_size=DISEASE_MAX_BATCH,
+        max_wait_ms=DISEASE_BATCH_WAIT_MS
+    )
+    disease_batcher.start()
+    print(f" Dynamic batching enabled (max batch {DISEASE_MAX_BATCH}, wait {DISEASE_BATCH_WAIT_MS} ms)")
+    
+    # Warm up in the background so /health can answer (not ready) meanwhile
+    service_status = "warming_up"
+    warmup_task = asyncio.create_task(warm_up_model(), name="disease-warmup")
 
-def preprocess_image(image_data: bytes, target_size=(224, 224)):
-    """Preprocess uploaded image for model prediction"""
+def batch_buckets() -> list:
+    """Batch sizes the model is ever called with: powers of two up to DISEASE_MAX_BATCH"""
+    buckets = []
+    size = 1
+    while size < DISEASE_MAX_BATCH:
+        buckets.append(size)
+        size *= 2
+    buckets.append(DISEASE_MAX_BATCH)
+    return buckets
+
+async def warm_up_model():
+    """Trace the graph and select kernels for every batch bucket before taking traffic"""
+    global service_status, warmup_seconds
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
     try:
-        image = Image.open(io.BytesIO(image_data))
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        image = image.resize(target_size)
-        img_array = np.array(image, dtype=np.float32)
-        # Normalize to [0, 1] range as per training (rescale=1./255)
-        img_array = img_array / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        return img_array
+        for size in batch_buckets():
+            dummy = np.zeros((size, *model_input_size, 3), dtype=np.float32)
+            for _ in range(DISEASE_WARMUP_ROUNDS):
+                await loop.run_in_executor(model_pool, inference_backend.predict, dummy)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+        print(f"! Warm-up failed, serving cold: {e}")
+    warmup_seconds = round(time.perf_counter() - started, 2)
+    service_status = "ready"
+    print(f" Warm-up finished in {warmup_seconds}s for batch sizes {batch_buckets()}")
 
-def parse_disease_name(class_name: str):
-    """Parse disease class name into plant and disease"""
+async def shutdown_disease_service():
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+    if disease_batcher is not None:
+        await disease_batcher.close()
+    model_pool.shutdown(wait=False)
+    decode_pool.shutdown(wait=False)
+    if prediction_writer is not None:
+        await prediction_writer.close()
+    if mongo_client is not None:
+        mongo_client.close()
+        print("✓ MongoDB connection closed")
+
+def resolve_input_size(model, model_path: str) -> tuple:
+    """
+    Read (height, width) from the model's input shape, falling back to the
+    img_size in a sibling <model>_config.json when the shape is not fixed
+    """
+    try:
+        input_shape = model.input_shape
+        if isinstance(input_shape, list):
+            input_shape = input_shape[0]
+        height, width = input_shape[1], input_shape[2]
+        if height and width:
+            return int(height), int(width)
+    except Exception:
+        pass
+    
+    config_path = os.path.splitext(model_path)[0] + "_config.json"
     try:
-        parts = class_name.split('___')
-        if len(parts) == 2:
-            plant = parts[0].replace('_', ' ').replace('(', '').replace(')', '')
-            disease = parts[1].replace('_', ' ')
-            return plant, disease
-        return class_name, "Unknown"
-    except:
-        return class_name, "Unknown"
+        if os.path.exists(config_path):
+            with open(config_path, 'r') as f:
+                img_size = json.load(f).get("img_size")
+            if img_size:
+                return int(img_size[0]), int(img_size[1])
+    except Exception as e:
+        print(f"! Failed to read input size from {config_path}: {e}")
+    
+    return DEFAULT_INPUT_SIZE
+
+def predict_batch(images: list) -> np.ndarray:
+    """
+    Normalize decoded uint8 images straight into the shared float32 buffer and run
+    the CNN once over it through the configured backend
+    """
+    if len(images) <= len(batch_buffer):
+        # Pad up to a warmed-up bucket size; the padded rows are ignored
+        bucket = next(size for size in batch_buckets() if size >= len(images))
+        batch = batch_buffer[:bucket]
+    else:
+        # Oversized scouting batches still run as a single tensor
+        batch = np.empty((len(images), *batch_buffer.shape[1:]), dtype=np.float32)
+    for slot, image in zip(batch, images):
+        # Normalize to [0, 1] range as per training (rescale=1./255)
+        np.divide(image, np.float32(255.0), out=slot)
+    return inference_backend.predict(batch)[:len(images)]
+
+async def run_disease_batch(images: list) -> list:
+    """Micro-batch callback: one forward pass over the queued images, then batch post-processing"""
+    loop = asyncio.get_running_loop()
+    probabilities = await loop.run_in_executor(model_pool, predict_batch, images)
+    return build_disease_results(probabilities)
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Identify the image format from the first bytes of an upload"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+async def read_upload(file: UploadFile) -> tuple:
+    """
+    Read a parsed upload in chunks, rejecting non-images from the first chunk and
+    files over DISEASE_MAX_UPLOAD_BYTES. The request body itself is capped earlier by
+    BodySizeLimitMiddleware. Returns (bytes, content hash)
+    """
+    if file.size is not None and file.size > DISEASE_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds the {DISEASE_MAX_UPLOAD_BYTES} byte upload limit"
+        )
+    
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    if sniff_image_format(chunk) is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Unsupported image format. Upload a JPEG, PNG, WebP, GIF, BMP or TIFF file."
+        )
+    
+    chunks = []
+    total_bytes = 0
+    hasher = hashlib.blake2b(digest_size=16)
+    while chunk:
+        total_bytes += len(chunk)
+        if total_bytes > DISEASE_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image exceeds the {DISEASE_MAX_UPLOAD_BYTES} byte upload limit"
+            )
+        hasher.update(chunk)
+        chunks.append(chunk)
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    
+    return b"".join(chunks), hasher.hexdigest()
+
+def decode_image(image_data: bytes, target_size=(224, 224)) -> np.ndarray:
+    """
+    Decode and resize an upload to a uint8 HxWx3 array; runs on the decode pool
+    target_size is PIL's (width, height)
+    """
+    image = Image.open(io.BytesIO(image_data))
+    # JPEG only: let the decoder downscale by 1/2, 1/4 or 1/8 in the DCT domain,
+    # never below target_size, so a 12 MP photo is not fully decoded first
+    image.draft('RGB', target_size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(target_size)
+    return np.asarray(image, dtype=np.uint8)
+
+async def preprocess_image(image_data: bytes, target_size=(224, 224)) -> np.ndarray:
+    """Preprocess uploaded image for model prediction without blocking the event loop"""
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(decode_pool, decode_image, image_data, target_size)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
 @app.get("/")
 async def root():
@@ -197,17 +580,36 @@ async def root():
         "status": "running",
         "model_loaded": disease_model is not None,
         "num_classes": len(disease_classes) if isinstance(disease_classes, list) else 0,
+        "input_size": f"{model_input_size[1]}x{model_input_size[0]}",
         "tensorflow_version": tf.__version__,
-        "endpoints": ["/health", "/api/detect-disease"]
+        "endpoints": ["/health", "/metrics", "/api/detect-disease", "/api/detect-disease/batch"]
     }
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
+    """Returns 503 until the model is loaded and warmed up, so load balancers skip cold replicas"""
+    content = {
+        "status": service_status,
+        "warmup_seconds": warmup_seconds,
         "model_loaded": disease_model is not None,
         "tensorflow_version": tf.__version__,
-        "num_classes": len(disease_classes) if isinstance(disease_classes, list) else 0
+        "num_classes": len(disease_classes) if isinstance(disease_classes, list) else 0,
+        "input_size": f"{model_input_size[1]}x{model_input_size[0]}",
+        "backend": inference_backend.name if inference_backend else None,
+        "backend_report": backend_report,
+        "result_cache": result_cache.stats()
+    }
+    return JSONResponse(status_code=200 if service_status == "ready" else 503, content=content)
+
+@app.get("/metrics")
+async def metrics():
+    """Dynamic batching latency, batch-size histogram, write-behind queue, history cache and webhook connection reuse"""
+    return {
+        "batching": disease_batcher.stats() if disease_batcher is not None else None,
+        "persistence": prediction_writer.stats() if prediction_writer is not None else None,
+        "history_cache": recent_history.stats() if recent_history is not None else None,
+        "webhook_connections": webhook_connection_stats.stats(),
+        "webhook_outbox": await webhook_outbox.stats() if webhook_outbox is not None else None
     }
 
 @app.get("/classes")
@@ -219,18 +621,40 @@ async def list_classes():
         "classes": classes_list
     }
 
+@app.post("/recommendations/reload")
+async def reload_recommendations():
+    """Re-read the recommendation table so edits apply without a redeploy"""
+    global disease_index
+    if disease_model is None:
+        raise HTTPException(status_code=503, detail="Disease detection model not loaded")
+    try:
+        disease_index = build_disease_index(
+            disease_classes, disease_model.output_shape[-1], DISEASE_RECOMMENDATIONS_PATH
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload recommendations: {e}")
+    # Cached responses embed the old recommendations
+    result_cache.clear()
+    return {
+        "success": True,
+        "classes": len(disease_index),
+        "source": DISEASE_RECOMMENDATIONS_PATH or "bundled"
+    }
+
 @app.get("/webhook-config")
 async def get_webhook_config():
     """Get webhook configuration"""
     return {
-        "webhook_url": "http://localhost:5678/webhook-test/trigger-email-alert",
+        "webhook_url": WEBHOOK_URL,
+        "batch_url": WEBHOOK_BATCH_URL or None,
         "enabled": True,
-        "description": "Sends prediction alerts after each disease detection"
+        "description": "Queues prediction alerts in a durable outbox after each disease detection",
+        "outbox": await webhook_outbox.stats() if webhook_outbox is not None else None
     }
 
 @app.post("/test-webhook")
 async def test_webhook():
-    """Test webhook connectivity"""
+    """Test webhook connectivity with a direct POST that bypasses the outbox"""
     test_data = {
         "plant": "Test Plant",
         "disease": "Test Disease",
@@ -247,14 +671,98 @@ async def test_webhook():
         "upload_time": datetime.now().isoformat()
     }
     
-    success = await send_webhook_alert(test_data, test_input)
+    success = await post_webhook(build_prediction_alert(test_data, test_input))
     
     return {
         "success": success,
-        "webhook_url": "http://localhost:5678/webhook-test/trigger-email-alert",
+        "webhook_url": WEBHOOK_URL,
         "message": "Webhook test completed" if success else "Webhook test failed"
     }
 
+def build_disease_results(probabilities: np.ndarray) -> List[dict]:
+    """Turn an (n, classes) probability matrix into n response payloads in one vectorized pass"""
+    probabilities = np.atleast_2d(np.asarray(probabilities))
+    indices, scores = top_k(probabilities, DISEASE_TOP_K)
+    
+    predicted = indices[:, 0]
+    confidence = scores[:, 0].astype(float)
+    is_healthy = disease_index.is_healthy[predicted]
+    severity = get_severity(confidence, is_healthy)
+    recommendations = disease_index.recommendations[predicted]
+    
+    top_plants = disease_index.plants[indices].tolist()
+    top_diseases = disease_index.diseases[indices].tolist()
+    top_confidence = np.round(scores.astype(float) * 100, 2).tolist()
+    listed = (scores >= DISEASE_MIN_CONFIDENCE).tolist()
+    
+    results = []
+    for row in range(len(probabilities)):
+        results.append({
+            "success": True,
+            "plant": top_plants[row][0],
+            "disease": top_diseases[row][0],
+            "confidence": top_confidence[row][0],
+            "is_healthy": bool(is_healthy[row]),
+            "top_predictions": [
+                {
+                    "plant": top_plants[row][j],
+                    "disease": top_diseases[row][j],
+                    "confidence": top_confidence[row][j]
+                }
+                for j in range(len(top_plants[row]))
+                if j == 0 or listed[row][j]
+            ],
+            "recommendations": recommendations[row],
+            "severity": str(severity[row])
+        })
+    return results
+
+async def classify_image(image_data: bytes) -> dict:
+    """Decode, batch-predict and post-process one upload"""
+    processed_image = await preprocess_image(
+        image_data, target_size=(model_input_size[1], model_input_size[0])
+    )
+    
+    # Make prediction, batched with concurrent uploads
+    return await disease_batcher.submit(processed_image)
+
+def disease_prediction_record(userId: str, prediction_date: Optional[str], timeframe: Optional[str],
+                              file: UploadFile, result: dict) -> dict:
+    """Build the MongoDB document stored for one disease detection"""
+    return {
+        "userId": userId,
+        "predictionType": "disease_detection",
+        "timestamp": datetime.utcnow(),
+        "prediction_date": prediction_date,
+        "timeframe": timeframe,
+        "input": {
+            "filename": file.filename,
+            "content_type": file.content_type
+        },
+        # Own copy: the handler adds "notification" to the response dict afterwards
+        "result": dict(result)
+    }
+
+def summarize_plot(results: List[dict]) -> dict:
+    """Plot-level aggregate for a scouting batch: prevalence per disease and worst severity"""
+    diseased = [r for r in results if not r["is_healthy"]]
+    counts = Counter((r["plant"], r["disease"]) for r in diseased)
+    return {
+        "images": len(results),
+        "diseased_images": len(diseased),
+        "disease_prevalence": round(len(diseased) / len(results) * 100, 2) if results else 0.0,
+        "max_severity": max((r["severity"] for r in results), key=SEVERITY_RANK.get, default="None"),
+        "diseases": [
+            {
+                "plant": plant,
+                "disease": disease,
+                "count": count,
+                "prevalence": round(count / len(results) * 100, 2)
+            }
+            for (plant, disease), count in counts.most_common()
+        ]
+    }
+
 @app.post("/api/detect-disease")
 async def detect_disease(
     file: UploadFile = File(...),
@@ -276,109 +784,203 @@ async def detect_disease(
                 detail="File must be an image (JPEG, PNG, etc.)"
             )
         
-        # Read and preprocess image
-        image_data = await file.read()
-        processed_image = preprocess_image(image_data)
+        # Stream the upload with a size cap, hashing as it arrives
+        image_data, content_hash = await read_upload(file)
+        
+        # Identical uploads (retries, re-sent photos) reuse the cached result
+        cache_key = f"{model_version}:{content_hash}"
+        cached_result = result_cache.get(cache_key)
+        if cached_result is None:
+            cached_result = await classify_image(image_data)
+            result_cache.set(cache_key, cached_result)
+        result = copy.deepcopy(cached_result)
+        
+        # Save to MongoDB and generate Gemini AI notification if userId provided
+        notification_message = None
+        if db is not None and userId:
+            prediction_record = disease_prediction_record(
+                userId, prediction_date, timeframe, file, result
+            )
+            
+            # Written in the background by the write-behind flusher (spilled if MongoDB is down)
+            prediction_writer.submit("disease_predictions", [prediction_record])
+            print(f"✓ Disease prediction queued for user: {userId}")
+            
+            # Previous predictions for historical analysis, from the per-user history cache
+            previous_predictions = await recent_history.context("disease_predictions", userId, limit=5)
+            recent_history.add("disease_predictions", userId, [prediction_record])
+            
+            # Generate Gemini AI notification off the event loop
+            try:
+                from utils.gemini_service import generate_disease_notification
+                notification_message = await run_in_threadpool(
+                    generate_disease_notification,
+                    prediction_record,
+                    previous_predictions
+                )
+                result["notification"] = notification_message
+            except ImportError:
+                print("⚠ Gemini service not available")
+            except Exception as e:
+                print(f"⚠ Failed to generate Gemini notification: {e}")
+        
+        # Queue the webhook alert; the outbox worker delivers it in the background
+        user_input_data = {
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "upload_time": datetime.now().isoformat()
+        }
+        await send_webhook_alert(result, user_input_data)
+        
+        return result
         
-        # Make prediction
-        predictions = disease_model.predict(processed_image, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_idx])
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/user/prediction-history")
+async def delete_disease_history(userId: str):
+    """
+    Delete a user's disease predictions, including ones this service still has queued
+    or spilled; api_server_mongodb.py forwards its history DELETE here
+    """
+    try:
+        if db is None:
+            raise HTTPException(status_code=503, detail="Database not connected")
         
-        # Prepare classes list safely
-        classes_list = disease_classes if isinstance(disease_classes, list) else []
+        # Queued or spilled records would otherwise be inserted after the delete
+        dropped = await prediction_writer.discard(userId)
+        result = await db.disease_predictions.delete_many({"userId": userId})
+        recent_history.invalidate(userId)
         
-        # Get predicted class name
-        if predicted_class_idx < len(classes_list):
-            predicted_class = classes_list[predicted_class_idx]
-        else:
-            predicted_class = f"Class_{predicted_class_idx}"
+        return {
+            "success": True,
+            "deleted": {"disease_predictions": result.deleted_count},
+            "pending_dropped": dropped
+        }
         
-        # Parse disease information
-        plant_name, disease_name = parse_disease_name(predicted_class)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/detect-disease/batch")
+async def detect_disease_batch(
+    files: List[UploadFile] = File(...),
+    userId: Optional[str] = Form(None),
+    prediction_date: Optional[str] = Form(None),
+    timeframe: Optional[str] = Form(None)
+):
+    """
+    Diagnose many leaf photos from one plot in a single request
+    Images are decoded in parallel and run through the CNN as one tensor; the plot
+    gets one bulk Mongo write, one Gemini notification and one webhook
+    """
+    try:
+        if disease_model is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Disease detection model not loaded. Check server logs for details."
+            )
         
-        # Get top 3 predictions
-        top_3_indices = np.argsort(predictions[0])[-3:][::-1]
-        top_predictions = []
-        for idx in top_3_indices:
-            if idx < len(classes_list):
-                class_name = classes_list[idx]
-                plant, disease = parse_disease_name(class_name)
-                top_predictions.append({
-                    "plant": plant,
-                    "disease": disease,
-                    "confidence": round(float(predictions[0][idx]) * 100, 2)
-                })
+        if len(files) > DISEASE_MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch exceeds {DISEASE_MAX_BATCH_FILES} images"
+            )
         
-        # Determine if plant is healthy
-        is_healthy = 'healthy' in disease_name.lower()
+        for file in files:
+            if not file.content_type or not file.content_type.startswith('image/'):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{file.filename}: file must be an image (JPEG, PNG, etc.)"
+                )
         
-        # Generate recommendations
-        recommendations = generate_recommendations(plant_name, disease_name, is_healthy)
+        # Read uploads one at a time: cached photos are answered from the cache, the rest
+        # start decoding right away so only one upload's raw bytes are held at a time
+        target_size = (model_input_size[1], model_input_size[0])
+        results = [None] * len(files)
+        cache_keys = []
+        decoding = {}
+        total_bytes = 0
+        try:
+            for i, file in enumerate(files):
+                image_data, content_hash = await read_upload(file)
+                total_bytes += len(image_data)
+                if total_bytes > DISEASE_MAX_BATCH_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Batch exceeds {DISEASE_MAX_BATCH_BYTES} bytes of images"
+                    )
+                cache_keys.append(f"{model_version}:{content_hash}")
+                results[i] = result_cache.get(cache_keys[i])
+                if results[i] is None:
+                    decoding[i] = asyncio.ensure_future(preprocess_image(image_data, target_size=target_size))
+                del image_data
+        except BaseException:
+            for task in decoding.values():
+                task.cancel()
+            raise
         
-        # Prepare response
-        result = {
+        # Classify everything not served from the cache as one tensor
+        misses = list(decoding)
+        if misses:
+            images = await asyncio.gather(*decoding.values())
+            loop = asyncio.get_running_loop()
+            probabilities = await loop.run_in_executor(model_pool, predict_batch, list(images))
+            for i, result in zip(misses, build_disease_results(probabilities)):
+                results[i] = result
+                result_cache.set(cache_keys[i], results[i])
+        
+        results = [copy.deepcopy(result) for result in results]
+        for file, result in zip(files, results):
+            result["filename"] = file.filename
+        summary = summarize_plot(results)
+        
+        response = {
             "success": True,
-            "plant": plant_name,
-            "disease": disease_name,
-            "confidence": round(confidence * 100, 2),
-            "is_healthy": is_healthy,
-            "top_predictions": top_predictions,
-            "recommendations": recommendations,
-            "severity": get_severity(confidence, is_healthy)
+            "count": len(results),
+            "summary": summary,
+            "results": results
         }
         
-        # Save to MongoDB and generate Gemini AI notification if userId provided
-        notification_message = None
+        # One queued bulk write and one notification for the whole plot
         if db is not None and userId:
+            prediction_records = [
+                disease_prediction_record(userId, prediction_date, timeframe, file, result)
+                for file, result in zip(files, results)
+            ]
+            prediction_writer.submit("disease_predictions", prediction_records)
+            print(f"✓ {len(prediction_records)} disease predictions queued for user: {userId}")
+            
+            previous_predictions = await recent_history.context("disease_predictions", userId, limit=5)
+            recent_history.add("disease_predictions", userId, prediction_records)
+            
+            # Notify about the most severe finding in the plot
+            worst_record = max(
+                prediction_records,
+                key=lambda r: (SEVERITY_RANK.get(r["result"]["severity"], 0), r["result"]["confidence"])
+            )
             try:
-                # Save prediction to database
-                prediction_record = {
-                    "userId": userId,
-                    "predictionType": "disease_detection",
-                    "timestamp": datetime.utcnow(),
-                    "prediction_date": prediction_date,
-                    "timeframe": timeframe,
-                    "input": {
-                        "filename": file.filename,
-                        "content_type": file.content_type
-                    },
-                    "result": result
-                }
-                db.disease_predictions.insert_one(prediction_record)
-                print(f"✓ Disease prediction saved for user: {userId}")
-                
-                # Fetch previous predictions for historical analysis
-                previous_predictions = list(db.disease_predictions.find(
-                    {"userId": userId},
-                    {"_id": 0}
-                ).sort("timestamp", -1).skip(1).limit(5))
-                
-                # Generate Gemini AI notification (import will be added)
-                try:
-                    from utils.gemini_service import generate_disease_notification
-                    notification_message = generate_disease_notification(
-                        prediction_record,
-                        previous_predictions
-                    )
-                    result["notification"] = notification_message
-                except ImportError:
-                    print("⚠ Gemini service not available")
-                except Exception as e:
-                    print(f"⚠ Failed to generate Gemini notification: {e}")
-                    
+                from utils.gemini_service import generate_disease_notification
+                response["notification"] = await run_in_threadpool(
+                    generate_disease_notification, worst_record, previous_predictions
+                )
+            except ImportError:
+                print("⚠ Gemini service not available")
             except Exception as e:
-                print(f"⚠ Failed to save prediction: {e}")
+                print(f"⚠ Failed to generate Gemini notification: {e}")
         
-        # Send webhook alert asynchronously (don't wait for response)
         user_input_data = {
-            "filename": file.filename,
-            "content_type": file.content_type,
+            "filenames": [file.filename for file in files],
             "upload_time": datetime.now().isoformat()
         }
-        asyncio.create_task(send_webhook_alert(result, user_input_data))
+        await send_batch_webhook_alert(summary, results, user_input_data)
         
-        return result
+        return response
         
     except HTTPException:
         raise
@@ -387,53 +989,43 @@ async def detect_disease(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_severity(confidence: float, is_healthy: bool) -> str:
-    if is_healthy:
-        return "None"
-    elif confidence > 0.9:
-        return "High"
-    elif confidence > 0.7:
-        return "Moderate"
-    else:
-        return "Low"
+def get_severity(confidence: np.ndarray, is_healthy: np.ndarray) -> np.ndarray:
+    """Severity per prediction: None when healthy, otherwise by confidence (0-1)"""
+    return np.select(
+        [is_healthy, confidence > 0.9, confidence > 0.7],
+        ["None", "High", "Moderate"],
+        default="Low"
+    )
 
-async def send_webhook_alert(prediction_data: dict, user_input: dict = None):
-    """Send prediction alert to webhook URL"""
-    webhook_url = "http://localhost:5678/webhook-test/trigger-email-alert"
+def webhook_model_info() -> dict:
+    """Model description attached to every webhook payload"""
+    return {
+        "model_name": disease_model_name,
+        "input_size": f"{model_input_size[1]}x{model_input_size[0]}",
+        "num_classes": len(disease_classes) if disease_classes else 0
+    }
+
+async def post_webhook(payload: dict, webhook_url: str = None) -> bool:
+    """POST one payload (a single alert or an {"events": [...]} batch) to the webhook URL"""
+    webhook_url = webhook_url or WEBHOOK_URL
+    
+    if webhook_client is None:
+        print("? Webhook client is not running")
+        return False
     
     try:
-        # Prepare webhook payload
-        payload = {
-            "timestamp": datetime.now().isoformat(),
-            "event_type": "disease_prediction",
-            "prediction": {
-                "plant": prediction_data.get("plant"),
-                "disease": prediction_data.get("disease"),
-                "confidence": prediction_data.get("confidence"),
-                "is_healthy": prediction_data.get("is_healthy"),
-                "severity": prediction_data.get("severity"),
-                "top_predictions": prediction_data.get("top_predictions", []),
-                "recommendations": prediction_data.get("recommendations", {})
-            },
-            "user_input": user_input or {},
-            "model_info": {
-                "model_name": "new_cnn.keras",
-                "input_size": "224x224",
-                "num_classes": len(disease_classes) if disease_classes else 0
-            }
-        }
+        # Reuses a pooled keep-alive connection when one is open
+        response = await webhook_client.post(
+            webhook_url, json=payload, extensions={"trace": webhook_connection_stats.trace}
+        )
         
-        # Send webhook asynchronously with timeout
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.post(webhook_url, json=payload)
+        if response.status_code == 200:
+            print(f"? Webhook alert sent successfully to {webhook_url}")
+            return True
+        else:
+            print(f"? Webhook returned status code: {response.status_code}")
+            return False
             
-            if response.status_code == 200:
-                print(f"? Webhook alert sent successfully to {webhook_url}")
-                return True
-            else:
-                print(f"? Webhook returned status code: {response.status_code}")
-                return False
-                
     except httpx.TimeoutException:
         print(f"? Webhook timeout - {webhook_url} did not respond in time")
         return False
@@ -441,67 +1033,70 @@ async def send_webhook_alert(prediction_data: dict, user_input: dict = None):
         print(f"? Failed to send webhook alert: {str(e)}")
         return False
 
-def generate_recommendations(plant: str, disease: str, is_healthy: bool):
-    """Generate treatment recommendations"""
-    if is_healthy:
-        return {
-            "treatment": "No treatment needed - plant appears healthy",
-            "prevention": [
-                "Continue regular monitoring",
-                "Maintain proper irrigation",
-                "Ensure adequate nutrition",
-                "Practice crop rotation"
-            ],
-            "pesticides": []
-        }
-    
-    recommendations_db = {
-        "Apple scab": {
-            "treatment": "Apply fungicides during early spring when leaves are emerging",
-            "prevention": ["Remove fallen leaves", "Prune for air circulation", "Apply dormant spray"],
-            "pesticides": ["Captan", "Myclobutanil", "Mancozeb"]
-        },
-        "Black rot": {
-            "treatment": "Remove infected plant parts immediately",
-            "prevention": ["Good sanitation", "Avoid overhead irrigation", "Preventive fungicides"],
-            "pesticides": ["Copper fungicides", "Mancozeb", "Chlorothalonil"]
-        },
-        "Early blight": {
-            "treatment": "Apply fungicide at first sign of disease",
-            "prevention": ["Disease-resistant varieties", "Crop rotation", "Mulch around plants"],
-            "pesticides": ["Chlorothalonil", "Mancozeb", "Copper fungicide"]
-        },
-        "Late blight": {
-            "treatment": "Apply fungicide immediately - spreads rapidly",
-            "prevention": ["Certified disease-free seeds", "Good air circulation", "Remove infected plants"],
-            "pesticides": ["Chlorothalonil", "Mancozeb", "Copper hydroxide"]
-        },
-        "Leaf Blast": {
-            "treatment": "Apply systemic fungicides",
-            "prevention": ["Resistant varieties", "Proper water management", "Balanced fertilization"],
-            "pesticides": ["Tricyclazole", "Carbendazim", "Azoxystrobin"]
+async def deliver_webhook_batch(payloads: List[dict]) -> List[bool]:
+    """Outbox sender: one POST for the whole batch, or one per alert without a batch URL"""
+    if WEBHOOK_BATCH_URL and len(payloads) > 1:
+        delivered = await post_webhook({"events": payloads}, WEBHOOK_BATCH_URL)
+        return [delivered] * len(payloads)
+    results = []
+    for payload in payloads:
+        results.append(await post_webhook(payload))
+    return results
+
+async def enqueue_webhook(payload: dict):
+    """Commit an alert to the outbox; falls back to a direct POST if the outbox is not running"""
+    if webhook_outbox is None:
+        return await post_webhook(payload)
+    try:
+        await webhook_outbox.enqueue(payload)
+        return True
+    except Exception as e:
+        print(f"⚠ Failed to queue webhook alert: {e}")
+        return False
+
+def build_prediction_alert(prediction_data: dict, user_input: dict = None) -> dict:
+    """Webhook payload for a single-image prediction"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "event_type": "disease_prediction",
+        "prediction": {
+            "plant": prediction_data.get("plant"),
+            "disease": prediction_data.get("disease"),
+            "confidence": prediction_data.get("confidence"),
+            "is_healthy": prediction_data.get("is_healthy"),
+            "severity": prediction_data.get("severity"),
+            "top_predictions": prediction_data.get("top_predictions", []),
+            "recommendations": prediction_data.get("recommendations", {})
         },
-        "Common rust": {
-            "treatment": "Apply fungicide when first pustules appear",
-            "prevention": ["Plant resistant hybrids", "Early planting", "Avoid late-season nitrogen"],
-            "pesticides": ["Azoxystrobin", "Propiconazole", "Tebuconazole"]
-        }
+        "user_input": user_input or {},
+        "model_info": webhook_model_info()
     }
-    
-    for key, value in recommendations_db.items():
-        if key.lower() in disease.lower():
-            return value
-    
-    return {
-        "treatment": "Consult local agricultural extension for specific treatment",
-        "prevention": [
-            "Monitor plants regularly",
-            "Remove infected plant parts",
-            "Maintain proper spacing",
-            "Practice crop rotation"
+
+async def send_webhook_alert(prediction_data: dict, user_input: dict = None):
+    """Queue a prediction alert for delivery to the webhook URL"""
+    return await enqueue_webhook(build_prediction_alert(prediction_data, user_input))
+
+async def send_batch_webhook_alert(summary: dict, results: List[dict], user_input: dict = None):
+    """Queue one alert summarising a multi-image plot diagnosis"""
+    payload = {
+        "timestamp": datetime.now().isoformat(),
+        "event_type": "disease_batch_prediction",
+        "summary": summary,
+        "predictions": [
+            {
+                "filename": result.get("filename"),
+                "plant": result.get("plant"),
+                "disease": result.get("disease"),
+                "confidence": result.get("confidence"),
+                "is_healthy": result.get("is_healthy"),
+                "severity": result.get("severity")
+            }
+            for result in results
         ],
-        "pesticides": ["Consult agricultural expert"]
+        "user_input": user_input or {},
+        "model_info": webhook_model_info()
     }
+    return await enqueue_webhook(payload)
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,13 +2,71 @@
 Simple Webhook Receiver for Disease Detection Alerts
 Runs on port 5678 and logs all incoming webhooks
 """
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import uvicorn
 from datetime import datetime
+from collections import deque
+import logging
+import logging.handlers
+import queue
 import json
+import os
+import sys
+from typing import Optional
+from dotenv import load_dotenv
 
-app = FastAPI(title="Webhook Receiver")
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.webhook_event_log import WebhookEventLog, as_object
+
+# Load environment variables
+load_dotenv()
+
+# Most recent webhooks kept in memory for /webhook-history and /webhook-latest
+WEBHOOK_HISTORY_SIZE = int(os.getenv("WEBHOOK_HISTORY_SIZE", "100"))
+
+# Persistent SQLite event log for replaying load tests; unset or blank uses backend/data,
+# "off" keeps history in memory only
+WEBHOOK_EVENT_LOG_PATH = os.getenv("WEBHOOK_EVENT_LOG_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "webhook_events.db"
+)
+if WEBHOOK_EVENT_LOG_PATH.lower() == "off":
+    WEBHOOK_EVENT_LOG_PATH = None
+
+# Console output per webhook: "banner" (multi-line summary), "json" (one line) or "off"
+WEBHOOK_LOG_MODE = os.getenv("WEBHOOK_LOG_MODE", "banner").lower()
+
+# Log records are formatted and written by a listener thread, never on the request path
+logger = logging.getLogger("webhook_receiver")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+
+event_log = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global event_log
+    # Startup
+    log_listener.start()
+    if WEBHOOK_EVENT_LOG_PATH:
+        event_log = WebhookEventLog(WEBHOOK_EVENT_LOG_PATH)
+        event_log.start()
+        logger.info(f"✓ Event log: {WEBHOOK_EVENT_LOG_PATH}")
+    
+    yield
+    
+    # Shutdown: flush queued events and log lines
+    if event_log is not None:
+        event_log.close()
+    log_listener.stop()
+
+app = FastAPI(title="Webhook Receiver", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -19,8 +77,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store received webhooks in memory
-webhook_history = []
+# Store received webhooks in memory; the ring buffer drops the oldest in O(1)
+webhook_history = deque(maxlen=WEBHOOK_HISTORY_SIZE)
+received_total = 0
 
 @app.get("/")
 async def root():
@@ -30,95 +89,188 @@ async def root():
         "port": 5678,
         "endpoints": {
             "webhook": "/webhook-test/trigger-email-alert",
+            "batch": "/webhook-test/trigger-email-alert/batch",
             "history": "/webhook-history",
             "latest": "/webhook-latest"
         },
-        "received_count": len(webhook_history)
+        "received_count": received_total,
+        "history_size": WEBHOOK_HISTORY_SIZE
     }
 
+def format_banner(payload: dict, received_at: str) -> str:
+    """Multi-line console summary of one webhook"""
+    lines = [
+        "",
+        "="*80,
+        f"🔔 WEBHOOK ALERT RECEIVED at {received_at}",
+        "="*80
+    ]
+    
+    if "prediction" in payload:
+        pred = as_object(payload["prediction"])
+        lines.append(f"\n📊 PREDICTION DETAILS:")
+        lines.append(f"   Plant:       {pred.get('plant', 'N/A')}")
+        lines.append(f"   Disease:     {pred.get('disease', 'N/A')}")
+        lines.append(f"   Confidence:  {pred.get('confidence', 0)}%")
+        lines.append(f"   Severity:    {pred.get('severity', 'N/A')}")
+        lines.append(f"   Healthy:     {'Yes' if pred.get('is_healthy') else 'No'}")
+    
+    if "user_input" in payload:
+        user = as_object(payload["user_input"])
+        lines.append(f"\n👤 USER INPUT:")
+        lines.append(f"   Filename:    {user.get('filename', 'N/A')}")
+        lines.append(f"   Type:        {user.get('content_type', 'N/A')}")
+        lines.append(f"   Uploaded:    {user.get('upload_time', 'N/A')}")
+    
+    if "model_info" in payload:
+        model = as_object(payload["model_info"])
+        lines.append(f"\n🤖 MODEL INFO:")
+        lines.append(f"   Model:       {model.get('model_name', 'N/A')}")
+        lines.append(f"   Input Size:  {model.get('input_size', 'N/A')}")
+        lines.append(f"   Classes:     {model.get('num_classes', 0)}")
+    
+    if "recommendations" in as_object(payload.get("prediction")):
+        rec = as_object(payload["prediction"]["recommendations"])
+        lines.append(f"\n💊 RECOMMENDATIONS:")
+        if rec.get('treatment'):
+            lines.append(f"   Treatment:   {rec['treatment'][:60]}...")
+        if rec.get('prevention'):
+            lines.append(f"   Prevention:  {', '.join(rec['prevention'][:2])}...")
+    
+    lines.append("\n" + "="*80)
+    lines.append(f"✅ Total webhooks received: {received_total}")
+    lines.append("="*80 + "\n")
+    return "\n".join(lines)
+
+def log_webhook(payload: dict, received_at: str):
+    """Queue the console line(s) for one webhook according to WEBHOOK_LOG_MODE"""
+    if WEBHOOK_LOG_MODE == "off":
+        return
+    if WEBHOOK_LOG_MODE == "json":
+        pred = as_object(payload.get("prediction"))
+        logger.info(json.dumps({
+            "received_at": received_at,
+            "event_type": payload.get("event_type"),
+            "plant": pred.get("plant"),
+            "disease": pred.get("disease"),
+            "confidence": pred.get("confidence"),
+            "severity": pred.get("severity"),
+            "total_received": received_total
+        }))
+    else:
+        logger.info(format_banner(payload, received_at))
+
+def record_webhook(payload: dict, received: datetime) -> str:
+    """Store one webhook in the ring buffer and the event log, and log it"""
+    global received_total
+    received_at = received.isoformat()
+    if event_log is not None:
+        event_log.append(payload, received)
+    webhook_history.append({
+        "received_at": received_at,
+        "payload": payload
+    })
+    received_total += 1
+    log_webhook(payload, received_at)
+    return received_at
+
+def require_object(payload, what: str = "Webhook payload"):
+    """Reject anything but a JSON object before it reaches the ring buffer or event log"""
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail=f"{what} must be a JSON object")
+
 @app.post("/webhook-test/trigger-email-alert")
 async def receive_webhook(request: Request):
     """Receive disease detection webhook alerts"""
     try:
         # Get the JSON payload
         payload = await request.json()
+        require_object(payload)
         
         # Add receipt timestamp
-        received_at = datetime.now().isoformat()
+        received_at = record_webhook(payload, datetime.now())
         
-        # Store webhook data
-        webhook_data = {
+        # Return success response
+        return {
+            "status": "success",
+            "message": "Webhook received successfully",
             "received_at": received_at,
-            "payload": payload
+            "total_received": received_total
         }
-        webhook_history.append(webhook_data)
         
-        # Keep only last 100 webhooks
-        if len(webhook_history) > 100:
-            webhook_history.pop(0)
-        
-        # Print to console with formatting
-        print("\n" + "="*80)
-        print(f"🔔 WEBHOOK ALERT RECEIVED at {received_at}")
-        print("="*80)
-        
-        if "prediction" in payload:
-            pred = payload["prediction"]
-            print(f"\n📊 PREDICTION DETAILS:")
-            print(f"   Plant:       {pred.get('plant', 'N/A')}")
-            print(f"   Disease:     {pred.get('disease', 'N/A')}")
-            print(f"   Confidence:  {pred.get('confidence', 0)}%")
-            print(f"   Severity:    {pred.get('severity', 'N/A')}")
-            print(f"   Healthy:     {'Yes' if pred.get('is_healthy') else 'No'}")
-        
-        if "user_input" in payload:
-            user = payload["user_input"]
-            print(f"\n👤 USER INPUT:")
-            print(f"   Filename:    {user.get('filename', 'N/A')}")
-            print(f"   Type:        {user.get('content_type', 'N/A')}")
-            print(f"   Uploaded:    {user.get('upload_time', 'N/A')}")
-        
-        if "model_info" in payload:
-            model = payload["model_info"]
-            print(f"\n🤖 MODEL INFO:")
-            print(f"   Model:       {model.get('model_name', 'N/A')}")
-            print(f"   Input Size:  {model.get('input_size', 'N/A')}")
-            print(f"   Classes:     {model.get('num_classes', 0)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"\n❌ ERROR receiving webhook: {str(e)}\n")
+        # A 4xx keeps senders from counting a rejected alert as delivered
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/webhook-test/trigger-email-alert/batch")
+async def receive_webhook_batch(request: Request):
+    """Receive many alerts in one request, as a JSON array or {"events": [...]}"""
+    try:
+        body = await request.json()
+        events = body.get("events") if isinstance(body, dict) else body
+        if not isinstance(events, list):
+            raise ValueError("Expected a JSON array of events or an object with an 'events' array")
         
-        if "prediction" in payload and "recommendations" in payload["prediction"]:
-            rec = payload["prediction"]["recommendations"]
-            print(f"\n💊 RECOMMENDATIONS:")
-            if rec.get('treatment'):
-                print(f"   Treatment:   {rec['treatment'][:60]}...")
-            if rec.get('prevention'):
-                print(f"   Prevention:  {', '.join(rec['prevention'][:2])}...")
+        for index, payload in enumerate(events):
+            require_object(payload, f"Event {index}")
         
-        print("\n" + "="*80)
-        print(f"✅ Total webhooks received: {len(webhook_history)}")
-        print("="*80 + "\n")
+        received = datetime.now()
+        for payload in events:
+            record_webhook(payload, received)
+        received_at = received.isoformat()
         
-        # Return success response
         return {
             "status": "success",
-            "message": "Webhook received successfully",
+            "message": f"Received {len(events)} webhooks",
             "received_at": received_at,
-            "total_received": len(webhook_history)
+            "accepted": len(events),
+            "total_received": received_total
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"\n❌ ERROR receiving webhook: {str(e)}\n")
-        return {
-            "status": "error",
-            "message": str(e)
-        }
+        logger.error(f"\n❌ ERROR receiving webhook batch: {str(e)}\n")
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/webhook-history")
-async def get_webhook_history(limit: int = 10):
-    """Get webhook history (last N webhooks)"""
+async def get_webhook_history(
+    limit: int = 10,
+    cursor: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    plant: Optional[str] = None,
+    disease: Optional[str] = None,
+    severity: Optional[str] = None
+):
+    """
+    Get webhook history, newest first. With the event log enabled, filter by
+    time range (ISO or epoch seconds), plant, disease and severity, and pass
+    next_cursor back as `cursor` to page further
+    """
+    limit = max(0, min(limit, 1000))
+    if event_log is None:
+        return {
+            "total_count": received_total,
+            "limit": limit,
+            "webhooks": list(webhook_history)[::-1][:limit],
+            "next_cursor": None
+        }
+    
+    try:
+        page = await run_in_threadpool(
+            event_log.query, limit, cursor, start, end, plant, disease, severity
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time filter: {e}")
     return {
-        "total_count": len(webhook_history),
+        "total_count": received_total,
         "limit": limit,
-        "webhooks": webhook_history[-limit:]
+        "webhooks": page["events"],
+        "next_cursor": page["next_cursor"]
     }
 
 @app.get("/webhook-latest")
@@ -138,8 +290,12 @@ async def get_latest_webhook():
 @app.delete("/webhook-history")
 async def clear_webhook_history():
     """Clear all webhook history"""
+    global received_total
     count = len(webhook_history)
     webhook_history.clear()
+    received_total = 0
+    if event_log is not None:
+        count = await run_in_threadpool(event_log.clear)
     return {
         "status": "success",
         "message": f"Cleared {count} webhooks from history"
@@ -151,7 +307,8 @@ async def health_check():
         "status": "healthy",
         "service": "webhook_receiver",
         "port": 5678,
-        "webhooks_received": len(webhook_history)
+        "webhooks_received": received_total,
+        "event_log": event_log.stats() if event_log is not None else None
     }
 
 if __name__ == "__main__":
@@ -160,6 +317,7 @@ if __name__ == "__main__":
     print("="*80)
     print(f"Listening on: http://0.0.0.0:5678")
     print(f"Webhook URL:  http://localhost:5678/webhook-test/trigger-email-alert")
+    print(f"Batch URL:    http://localhost:5678/webhook-test/trigger-email-alert/batch")
     print(f"History URL:  http://localhost:5678/webhook-history")
     print(f"Latest URL:   http://localhost:5678/webhook-latest")
     print("="*80 + "\n")
@@ -0,0 +1,25 @@
+"""
+Unit tests for the backend utilities
+Run from backend/: python -m pytest -q tests
+"""
+import asyncio
+import inspect
+import os
+import sys
+
+# Modules import each other as `utils.*`, relative to backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    """Poll `condition` (a plain or async callable) until it returns something true"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        result = condition()
+        if inspect.isawaitable(result):
+            result = await result
+        if result:
+            return
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
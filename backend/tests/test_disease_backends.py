@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from utils.disease_backends import tflite_cache_path, tflite_variant
+
+
+def make_images(root, names):
+    for class_name, filename in names:
+        os.makedirs(root / class_name, exist_ok=True)
+        Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(root / class_name / filename)
+
+
+def test_float16_needs_no_calibration():
+    assert tflite_variant("float16") == "float16"
+    assert tflite_cache_path("/models/cnn.keras", "float16") == os.path.join("/models", "cnn.float16.tflite")
+
+
+def test_int8_without_calibration_images_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="calibration"):
+        tflite_variant("int8")
+    with pytest.raises(ValueError, match="calibration"):
+        tflite_variant("int8", str(tmp_path))
+
+
+def test_unknown_quantization_is_refused():
+    with pytest.raises(ValueError, match="Unknown quantization"):
+        tflite_variant("int4")
+
+
+def test_int8_artifact_follows_calibration_set(tmp_path):
+    first, second = tmp_path / "a", tmp_path / "b"
+    make_images(first, [("Tomato___healthy", "1.png"), ("Tomato___Late_blight", "2.png")])
+    make_images(second, [("Tomato___healthy", "1.png")])
+
+    variant = tflite_variant("int8", str(first))
+    assert variant.startswith("int8-")
+    assert tflite_variant("int8", str(first)) == variant
+    assert tflite_variant("int8", str(second)) != variant
+
+    # Adding an image to the same folder is a new calibration set too
+    make_images(first, [("Tomato___healthy", "3.png")])
+    assert tflite_variant("int8", str(first)) != variant
+    assert tflite_cache_path("/models/cnn.keras", variant) != tflite_cache_path("/models/cnn.keras", "int8")
+
+
+def test_tflite_backend_keeps_one_interpreter_per_bucket(tmp_path):
+    tf = pytest.importorskip("tensorflow")
+    from utils.disease_backends import TFLiteBackend, convert_to_tflite
+
+    model = tf.keras.Sequential([
+        tf.keras.Input((8, 8, 3)),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(4, activation="softmax")
+    ])
+    model_path = str(tmp_path / "cnn.keras")
+    model.save(model_path)
+    backend = TFLiteBackend(convert_to_tflite(model, model_path, input_size=(8, 8)), batch_sizes=[1, 2, 4])
+    assert backend.input_size == (8, 8)
+
+    allocations = []
+    for interpreter, _, _ in [backend._spare, *backend._by_size.values()]:
+        allocate = interpreter.allocate_tensors
+        interpreter.allocate_tensors = lambda allocate=allocate: allocations.append(1) or allocate()
+
+    images = np.random.default_rng(0).random((4, 8, 8, 3), dtype=np.float32)
+    expected = model(images, training=False).numpy()
+    for size in (4, 1, 2, 4, 1):
+        np.testing.assert_allclose(backend.predict(images[:size]), expected[:size], atol=1e-2)
+    assert allocations == []
+
+    # Sizes outside the buckets still work through the spare interpreter
+    assert backend.predict(images[:3]).shape == (3, 4)
+    assert len(allocations) == 1
@@ -0,0 +1,139 @@
+import asyncio
+from datetime import datetime, timedelta
+from conftest import wait_for
+from utils.history_cache import RecentHistoryCache
+from utils.write_behind import WriteBehindWriter
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents = sorted(self.documents, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(document) for document in self.documents]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.documents if d["userId"] == query["userId"]])
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(documents)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+
+def record(user_id: str, n: int, minutes_ago: int = 0) -> dict:
+    return {"userId": user_id, "n": n, "timestamp": datetime.utcnow() - timedelta(minutes=minutes_ago)}
+
+
+async def flushed(db, count: int):
+    await wait_for(lambda: len(db["crop_predictions"].documents) >= count)
+
+
+def test_queued_records_of_uncached_user_are_visible():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehindWriter(db, flush_interval_ms=20)
+        writer.start()
+        cache = RecentHistoryCache(db, ["crop_predictions"])
+
+        records = [record("u1", n) for n in range(3)]
+        writer.submit("crop_predictions", records)
+        for r in records:
+            cache.add("crop_predictions", "u1", [r])
+        # MongoDB has nothing yet
+        assert [r["n"] for r in await cache.recent("crop_predictions", "u1")] == [2, 1, 0]
+
+        await flushed(db, 3)
+        assert [r["n"] for r in await cache.recent("crop_predictions", "u1")] == [2, 1, 0]
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_new_record_after_eviction_is_merged_with_history():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehindWriter(db, flush_interval_ms=5)
+        writer.start()
+        writer.submit("crop_predictions", [record("u1", 1, minutes_ago=10), record("u1", 2, minutes_ago=5)])
+        await flushed(db, 2)
+
+        cache = RecentHistoryCache(db, ["crop_predictions"], depth=6)
+        latest = record("u1", 3)
+        writer.submit("crop_predictions", [latest])
+        cache.add("crop_predictions", "u1", [latest])
+        # Flushed before the first read: matched up by _id, not listed twice
+        await flushed(db, 3)
+        recent = await cache.recent("crop_predictions", "u1")
+        assert [r["n"] for r in recent] == [3, 2, 1]
+        assert all("_id" not in r for r in recent)
+        assert cache.stats()["loads"] == 1
+
+        await cache.recent("crop_predictions", "u1")
+        assert cache.stats()["hits"] == 1
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_depth_limits_merged_buffer():
+    async def main():
+        db = FakeDatabase()
+        db["crop_predictions"].documents.extend(record("u1", n, minutes_ago=10 - n) for n in range(4))
+        cache = RecentHistoryCache(db, ["crop_predictions"], depth=3)
+        cache.add("crop_predictions", "u1", [record("u1", 9)])
+        assert [r["n"] for r in await cache.recent("crop_predictions", "u1")] == [9, 3, 2]
+
+    asyncio.run(main())
+
+
+class SlowCursor:
+    def sort(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(5)
+        return []
+
+
+class UnreachableDatabase:
+    """Every read waits like a driver that cannot select a server"""
+
+    def __getitem__(self, name):
+        return self
+
+    def find(self, *args, **kwargs):
+        return SlowCursor()
+
+
+def test_context_gives_up_after_read_timeout():
+    async def main():
+        cache = RecentHistoryCache(UnreachableDatabase(), ["crop_predictions"], read_timeout_ms=50)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await cache.context("crop_predictions", "u1") == []
+        assert loop.time() - started < 1
+
+    asyncio.run(main())
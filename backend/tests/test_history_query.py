@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+import pytest
+from bson import ObjectId
+from utils.history_query import (
+    HISTORY_COLLECTIONS, HISTORY_SORT, decode_cursor, encode_cursor, history_pipeline
+)
+
+
+def test_cursor_round_trip():
+    object_id = ObjectId()
+    for timestamp in (datetime(2025, 3, 1, 12, 30, 5, 123000), datetime(2025, 3, 1, tzinfo=timezone.utc)):
+        cursor = encode_cursor(timestamp, object_id)
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == (timestamp, object_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime(2025, 1, 1), ObjectId())[:-4]])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_single_type_pipeline_reads_one_collection():
+    collection, pipeline = history_pipeline("u1", ["yield"], 20)
+    assert collection == "yield_predictions"
+    assert [next(iter(stage)) for stage in pipeline] == ["$match", "$sort", "$limit", "$project"]
+    assert pipeline[0] == {"$match": {"userId": "u1"}}
+    assert pipeline[2] == {"$limit": 20}
+    assert pipeline[3]["$project"]["type"] == {"$literal": "yield"}
+
+
+def test_union_pipeline_covers_every_type_once():
+    types = list(HISTORY_COLLECTIONS)
+    collection, pipeline = history_pipeline("u1", types, 11)
+    assert collection == HISTORY_COLLECTIONS[types[0]]
+
+    unions = [stage["$unionWith"] for stage in pipeline if "$unionWith" in stage]
+    assert [union["coll"] for union in unions] == [HISTORY_COLLECTIONS[t] for t in types[1:]]
+    for prediction_type, union in zip(types[1:], unions):
+        branch = union["pipeline"]
+        assert branch[0] == {"$match": {"userId": "u1"}}
+        assert branch[2] == {"$limit": 11}
+        assert branch[3]["$project"]["type"] == {"$literal": prediction_type}
+    # Merged branches are re-sorted and cut to one page
+    assert pipeline[-2:] == [{"$sort": HISTORY_SORT}, {"$limit": 11}]
+
+
+def test_cursor_seeks_past_last_item_in_every_branch():
+    timestamp, object_id = datetime(2025, 3, 1, 12, 0), ObjectId()
+    after = decode_cursor(encode_cursor(timestamp, object_id))
+    _, pipeline = history_pipeline("u1", ["crop", "disease"], 5, after)
+    expected = {
+        "userId": "u1",
+        "$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": object_id}}
+        ]
+    }
+    assert pipeline[0] == {"$match": expected}
+    assert pipeline[4]["$unionWith"]["pipeline"][0] == {"$match": expected}
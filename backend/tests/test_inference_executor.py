@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import pytest
+from utils.inference_executor import InferenceExecutor, ExecutorSaturated
+
+
+def test_run_returns_result_off_loop_thread():
+    async def main():
+        executor = InferenceExecutor(max_workers=2, max_queue=2)
+        try:
+            loop_thread = threading.get_ident()
+            result, thread = await executor.run(lambda x, y=0: (x + y, threading.get_ident()), 2, y=3)
+            assert result == 5
+            assert thread != loop_thread
+            assert executor.stats()["completed"] == 1
+        finally:
+            executor.shutdown()
+
+    asyncio.run(main())
+
+
+def test_run_rejects_when_backlog_full():
+    async def main():
+        executor = InferenceExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            jobs = [asyncio.create_task(executor.run(release.wait, 5)) for _ in range(executor.capacity)]
+            await asyncio.sleep(0)
+            with pytest.raises(ExecutorSaturated):
+                await executor.run(lambda: None)
+            assert executor.stats()["rejected"] == 1
+            assert executor.stats()["in_flight"] == executor.capacity
+
+            release.set()
+            assert await asyncio.gather(*jobs) == [True, True]
+            # Capacity frees up once jobs finish
+            assert await executor.run(lambda: "ok") == "ok"
+            assert executor.stats()["in_flight"] == 0
+        finally:
+            release.set()
+            executor.shutdown()
+
+    asyncio.run(main())
+
+
+def test_exceptions_propagate_and_release_slot():
+    async def main():
+        executor = InferenceExecutor(max_workers=1, max_queue=0)
+        try:
+            with pytest.raises(ZeroDivisionError):
+                await executor.run(lambda: 1 / 0)
+            assert executor.stats()["in_flight"] == 0
+            assert await executor.run(lambda: 1) == 1
+        finally:
+            executor.shutdown()
+
+    asyncio.run(main())
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("INFERENCE_WORKERS", "3")
+    monkeypatch.setenv("INFERENCE_QUEUE_DEPTH", "7")
+    monkeypatch.setenv("INFERENCE_USE_PROCESSES", "false")
+    executor = InferenceExecutor.from_env()
+    try:
+        assert executor.capacity == 10
+        assert executor.stats()["mode"] == "thread"
+    finally:
+        executor.shutdown()
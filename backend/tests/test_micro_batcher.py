@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from utils.inference_executor import ExecutorSaturated
+from utils.micro_batcher import MicroBatcher, _size_bucket
+
+
+class FakeModel:
+    """run_batch stand-in that records batch sizes and can be held open"""
+
+    def __init__(self):
+        self.batches = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await self.release.wait()
+        return [item * 10 for item in items]
+
+
+def test_idle_item_dispatched_alone():
+    async def main():
+        model = FakeModel()
+        batcher = MicroBatcher("test", model, max_batch_size=8, max_wait_ms=50)
+        assert await batcher.submit(1) == 10
+        assert model.batches == [[1]]
+        await batcher.close()
+
+    asyncio.run(main())
+
+
+def test_concurrent_items_coalesce_and_fan_out():
+    async def main():
+        model = FakeModel()
+        batcher = MicroBatcher("test", model, max_batch_size=4, max_wait_ms=20)
+        model.release.clear()
+        first = asyncio.create_task(batcher.submit(0))
+        await asyncio.sleep(0.01)
+        # The model is busy, so these wait for one shared batch
+        rest = [asyncio.create_task(batcher.submit(i)) for i in range(1, 6)]
+        await asyncio.sleep(0.01)
+        model.release.set()
+
+        assert await first == 0
+        assert await asyncio.gather(*rest) == [10, 20, 30, 40, 50]
+        assert model.batches[0] == [0]
+        assert [len(batch) for batch in model.batches[1:]] == [4, 1]
+        stats = batcher.stats()
+        assert stats["batches"] == 3 and stats["items"] == 6
+        assert stats["batch_size_histogram"]["3-4"] == 1
+        await batcher.close()
+
+    asyncio.run(main())
+
+
+def test_batch_error_fails_every_item():
+    async def main():
+        async def broken(items):
+            raise RuntimeError("model failed")
+
+        batcher = MicroBatcher("test", broken)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert batcher.stats()["errors"] >= 1
+        await batcher.close()
+
+    asyncio.run(main())
+
+
+def test_max_pending_items_rejects_overload():
+    async def main():
+        model = FakeModel()
+        model.release.clear()
+        batcher = MicroBatcher("test", model, max_batch_size=2, max_pending_items=3)
+        waiting = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ExecutorSaturated):
+            await batcher.submit(99)
+        stats = batcher.stats()
+        assert stats["rejected"] == 1 and stats["pending"] == 3
+
+        model.release.set()
+        assert await asyncio.gather(*waiting) == [0, 10, 20]
+        assert batcher.stats()["pending"] == 0
+        assert await batcher.submit(4) == 40
+        await batcher.close()
+
+    asyncio.run(main())
+
+
+def test_close_fails_queued_items():
+    async def main():
+        model = FakeModel()
+        model.release.clear()
+        batcher = MicroBatcher("test", model, max_batch_size=1)
+        running = asyncio.create_task(batcher.submit(1))
+        queued = asyncio.create_task(batcher.submit(2))
+        await asyncio.sleep(0.01)
+
+        closing = asyncio.create_task(batcher.close())
+        await asyncio.sleep(0.01)
+        model.release.set()
+        await closing
+        assert await running == 10
+        with pytest.raises(RuntimeError):
+            await queued
+
+    asyncio.run(main())
+
+
+def test_size_bucket():
+    assert [_size_bucket(n) for n in (1, 2, 3, 4, 5, 8, 9)] == ["1", "2", "3-4", "3-4", "5-8", "5-8", "9-16"]
@@ -0,0 +1,101 @@
+from collections import Counter
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+from utils.tabular_inference import (
+    SOIL_TYPES, encode_column, predict_crop_batch, stack_base_predictions,
+    summarize_probabilities, summarize_votes
+)
+
+CROPS = ["rice", "maize", "cotton", "coffee", "jute"]
+
+
+@pytest.fixture(scope="module")
+def crop_stack():
+    """Small crop bundle shaped like crop_recommendation_ensemble: scaler, encoder, base and meta models"""
+    rng = np.random.default_rng(0)
+    labels = rng.choice(CROPS, size=300)
+    centers = {crop: rng.normal(0, 3, size=7) for crop in CROPS}
+    features = np.array([centers[label] for label in labels]) + rng.normal(0, 1.5, size=(300, 7))
+
+    label_encoder = LabelEncoder().fit(labels)
+    targets = label_encoder.transform(labels)
+    scaler = StandardScaler().fit(features)
+    scaled = scaler.transform(features)
+    base_models = {
+        "tree": DecisionTreeClassifier(max_depth=4, random_state=0).fit(scaled, targets),
+        "knn": KNeighborsClassifier(n_neighbors=7).fit(scaled, targets),
+        "nb": GaussianNB().fit(scaled, targets)
+    }
+    meta_model = LogisticRegression(max_iter=1000).fit(stack_base_predictions(base_models, scaled), targets)
+    model_data = {"scaler": scaler, "label_encoder": label_encoder, "base_models": base_models, "meta_model": meta_model}
+    return model_data, features[:50]
+
+
+def test_crop_prediction_matches_meta_model(crop_stack):
+    model_data, features = crop_stack
+    predicted, confidence, alternatives = predict_crop_batch(model_data, features)
+
+    base = stack_base_predictions(model_data["base_models"], model_data["scaler"].transform(features))
+    expected = model_data["label_encoder"].inverse_transform(model_data["meta_model"].predict(base))
+    probabilities = model_data["meta_model"].predict_proba(base)
+    assert list(predicted) == list(expected)
+    np.testing.assert_allclose(confidence, probabilities.max(axis=1) * 100)
+
+    for name, row in zip(predicted, alternatives):
+        assert len(row) <= 3
+        assert name not in [alt["crop"] for alt in row]
+        scores = [alt["confidence"] for alt in row]
+        assert scores == sorted(scores, reverse=True)
+        assert all(score > 0 for score in scores)
+
+
+def test_summarize_probabilities_ranks_top_k():
+    probabilities = np.array([
+        [0.1, 0.6, 0.05, 0.2, 0.05],
+        [0.3, 0.3, 0.2, 0.1, 0.1],
+        [0.0, 0.0, 1.0, 0.0, 0.0],
+    ])
+    predicted, confidence, alternatives = summarize_probabilities(probabilities, CROPS, max_alternatives=2)
+    assert predicted[0] == "maize"
+    assert alternatives[0] == [{"crop": "coffee", "confidence": 20.0}, {"crop": "rice", "confidence": 10.0}]
+    # Ties keep a stable order and the winner is never repeated as an alternative
+    assert predicted[1] in ("rice", "maize")
+    assert [alt["crop"] for alt in alternatives[1]] == [c for c in ("rice", "maize") if c != predicted[1]] + ["cotton"]
+    # Zero-probability classes are not offered as alternatives
+    assert predicted[2] == "cotton" and alternatives[2] == []
+    np.testing.assert_allclose(confidence, [60.0, 30.0, 100.0])
+
+
+def test_summarize_probabilities_with_fewer_classes_than_k():
+    predicted, _, alternatives = summarize_probabilities(np.array([[0.25, 0.75]]), ["a", "b"], label_key="x")
+    assert list(predicted) == ["b"]
+    assert alternatives == [[{"x": "a", "confidence": 25.0}]]
+
+
+def test_summarize_votes_matches_row_by_row_counting():
+    rng = np.random.default_rng(1)
+    votes = rng.integers(0, 4, size=(40, 5))
+    encoder = LabelEncoder().fit(CROPS[:4])
+    confidence, alternatives = summarize_votes(votes, encoder)
+
+    for row, row_confidence, row_alternatives in zip(votes, confidence, alternatives):
+        ranked = Counter(row.tolist()).most_common()
+        assert row_confidence == pytest.approx(ranked[0][1] / 5 * 100)
+        assert row_alternatives == [
+            {"crop": encoder.inverse_transform([code])[0], "confidence": round(count / 5 * 100, 2)}
+            for code, count in ranked[1:4]
+        ]
+
+    assert summarize_votes(votes, max_alternatives=0)[1] == [[] for _ in range(40)]
+
+
+def test_encode_column_matches_dict_lookup():
+    values = ["Loamy", "Clayey", "Peaty", "Sandy", None, "loamy"]
+    old = [float({name: i for i, name in enumerate(SOIL_TYPES)}.get(value, 0)) for value in values]
+    np.testing.assert_array_equal(encode_column(values, SOIL_TYPES), old)
+    assert encode_column(values, SOIL_TYPES).tolist() == [1.0, 4.0, 0.0, 0.0, 0.0, 0.0]
@@ -0,0 +1,111 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from utils.webhook_event_log import WebhookEventLog
+
+BASE = datetime(2025, 6, 1, 12, 0, 0)
+PLANTS = ["Tomato", "Potato", "Corn"]
+
+
+@pytest.fixture
+def log(tmp_path):
+    """Ten events one minute apart: ids 1..10, plants cycling through PLANTS"""
+    event_log = WebhookEventLog(str(tmp_path / "events.db"))
+    event_log.start()
+    for i in range(10):
+        event_log.append(
+            {"event_type": "disease_detected", "n": i,
+             "prediction": {"plant": PLANTS[i % 3], "disease": "Blight", "severity": "High", "confidence": "0.9"}},
+            BASE + timedelta(minutes=i)
+        )
+    event_log.close()
+    return event_log
+
+
+def numbers(page) -> list:
+    return [event["payload"]["n"] for event in page["events"]]
+
+
+def at(minutes: float) -> datetime:
+    return BASE + timedelta(minutes=minutes)
+
+
+def test_first_id_at(log):
+    conn = sqlite3.connect(log.path)
+    try:
+        assert WebhookEventLog._first_id_at(conn, at(0).timestamp()) == 1
+        # Between two events: the next one
+        assert WebhookEventLog._first_id_at(conn, at(3.5).timestamp()) == 5
+        assert WebhookEventLog._first_id_at(conn, at(9).timestamp()) == 10
+        assert WebhookEventLog._first_id_at(conn, at(9.5).timestamp()) is None
+    finally:
+        conn.close()
+
+
+def test_time_range_is_start_inclusive_end_exclusive(log):
+    assert numbers(log.query(limit=20, start=at(3), end=at(6))) == [5, 4, 3]
+    # Epoch seconds and ISO strings are both accepted
+    assert numbers(log.query(limit=20, start=at(2.5).timestamp(), end=at(4.5).isoformat())) == [4, 3]
+
+
+def test_open_ended_ranges(log):
+    assert numbers(log.query(limit=20, start=at(7))) == [9, 8, 7]
+    assert numbers(log.query(limit=20, end=at(2))) == [1, 0]
+    # End after the last event: no id bound, every event matches
+    assert numbers(log.query(limit=20, end=at(60))) == list(range(9, -1, -1))
+
+
+def test_start_after_last_event_matches_nothing(log):
+    # No id at or after start: the query gets a constant false clause
+    page = log.query(limit=20, start=at(30))
+    assert page == {"events": [], "next_cursor": None}
+    assert log.query(limit=20, start=at(30), plant="Tomato")["events"] == []
+
+
+def test_end_before_first_event_matches_nothing(log):
+    assert log.query(limit=20, end=at(-5))["events"] == []
+
+
+def test_cursor_pages_through_column_filter(log):
+    pages, cursor = [], None
+    while True:
+        page = log.query(limit=2, cursor=cursor, plant="Tomato")
+        pages.append(numbers(page))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [[9, 6], [3, 0]]
+    assert log.query(limit=4, plant="Tomato")["next_cursor"] is None
+
+
+def test_cursor_with_time_range_and_filter(log):
+    first = log.query(limit=1, start=at(1), end=at(9), plant="Potato")
+    assert numbers(first) == [7]
+    second = log.query(limit=1, cursor=first["next_cursor"], start=at(1), end=at(9), plant="Potato")
+    assert numbers(second) == [4]
+    third = log.query(limit=1, cursor=second["next_cursor"], start=at(1), end=at(9), plant="Potato")
+    assert numbers(third) == [1] and third["next_cursor"] is None
+
+
+def test_filtered_pages_walk_the_id_index(log):
+    conn = sqlite3.connect(log.path)
+    try:
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM events WHERE id < ? AND plant = ? ORDER BY id DESC LIMIT 3",
+            (100, "Tomato")
+        ))
+    finally:
+        conn.close()
+    assert "idx_events_plant_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_malformed_payload_fields_are_still_logged(tmp_path):
+    event_log = WebhookEventLog(str(tmp_path / "events.db"))
+    event_log.start()
+    event_log.append({"prediction": "not an object", "summary": [1], "n": 0}, BASE)
+    event_log.append({"prediction": {"plant": "Corn", "confidence": "high"}, "n": 1}, BASE)
+    event_log.close()
+    assert event_log.stats()["failed"] == 0
+    assert numbers(event_log.query(limit=5)) == [1, 0]
+    assert numbers(event_log.query(limit=5, plant="Corn")) == [1]
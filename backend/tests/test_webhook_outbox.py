@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+import time
+from conftest import wait_for
+from utils.webhook_outbox import WebhookOutbox
+
+
+class FakeReceiver:
+    """send_batch stand-in; fails the first `failures` POSTs"""
+
+    def __init__(self, failures: int = 0, raises: bool = False):
+        self.failures = failures
+        self.raises = raises
+        self.posts = []
+
+    async def __call__(self, payloads):
+        self.posts.append(payloads)
+        if len(self.posts) <= self.failures:
+            if self.raises:
+                raise ConnectionError("receiver down")
+            return [False] * len(payloads)
+        return [True] * len(payloads)
+
+
+def rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT status, attempts, last_error FROM outbox ORDER BY id").fetchall()
+
+
+def test_burst_is_delivered_in_one_batch(tmp_path):
+    async def main():
+        receiver = FakeReceiver()
+        outbox = WebhookOutbox(str(tmp_path / "outbox.db"), receiver, batch_size=10, linger_ms=50)
+        await outbox.start()
+        # Let the worker go idle so the burst arrives while it lingers
+        await asyncio.sleep(0.05)
+        for i in range(5):
+            await outbox.enqueue({"n": i})
+        await wait_for(lambda: _delivered(outbox, 5))
+        assert [p["n"] for batch in receiver.posts for p in batch] == [0, 1, 2, 3, 4]
+        assert len(receiver.posts) <= 2
+        assert (await outbox.stats())["pending"] == 0
+        await outbox.close()
+
+    asyncio.run(main())
+
+
+def test_failed_delivery_backs_off_then_succeeds(tmp_path):
+    async def main():
+        receiver = FakeReceiver(failures=2, raises=True)
+        outbox = WebhookOutbox(str(tmp_path / "outbox.db"), receiver, linger_ms=0, base_backoff=0.05)
+        await outbox.start()
+        started = time.monotonic()
+        await outbox.enqueue({"n": 1})
+        await wait_for(lambda: _delivered(outbox, 1))
+        # Two retries, waiting at least half of 0.05s and 0.1s
+        assert time.monotonic() - started >= 0.07
+        stats = await outbox.stats()
+        assert stats["posts"] == 3 and stats["failed_attempts"] == 2
+        assert stats["last_error"] == "receiver down"
+        await outbox.close()
+
+    asyncio.run(main())
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    async def main():
+        path = str(tmp_path / "outbox.db")
+        receiver = FakeReceiver(failures=100)
+        outbox = WebhookOutbox(path, receiver, linger_ms=0, base_backoff=0.01, max_attempts=3)
+        await outbox.start()
+        await outbox.enqueue({"n": 1})
+        await wait_for(lambda: _dead(outbox, 1))
+        await asyncio.sleep(0.1)
+        assert len(receiver.posts) == 3
+        await outbox.close()
+        assert rows(path) == [("dead", 3, "delivery failed")]
+
+    asyncio.run(main())
+
+
+def test_pending_alerts_survive_restart(tmp_path):
+    async def main():
+        path = str(tmp_path / "outbox.db")
+        down = FakeReceiver(failures=100)
+        outbox = WebhookOutbox(path, down, linger_ms=0, base_backoff=60)
+        await outbox.start()
+        await outbox.enqueue({"n": 1})
+        await wait_for(lambda: _attempted(outbox))
+        await outbox.close()
+        assert rows(path)[0][:2] == ("pending", 1)
+
+        receiver = FakeReceiver()
+        outbox = WebhookOutbox(path, receiver, linger_ms=0)
+        # Pretend the backoff has passed
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE outbox SET next_attempt_at = 0")
+        await outbox.start()
+        await wait_for(lambda: _delivered(outbox, 1))
+        assert receiver.posts == [[{"n": 1}]]
+        await outbox.close()
+
+    asyncio.run(main())
+
+
+async def _delivered(outbox, count):
+    return (await outbox.stats())["delivered"] >= count
+
+
+async def _dead(outbox, count):
+    return (await outbox.stats())["dead"] >= count
+
+
+async def _attempted(outbox):
+    return (await outbox.stats())["failed_attempts"] >= 1
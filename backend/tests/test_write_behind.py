@@ -0,0 +1,244 @@
+import asyncio
+import os
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from conftest import wait_for
+from utils.write_behind import WriteBehindWriter
+
+
+class FakeCollection:
+    def __init__(self, db):
+        self.db = db
+        self.documents = {}
+
+    async def insert_many(self, documents, ordered=True):
+        if self.db.down:
+            raise ConnectionError("MongoDB unreachable")
+        self.db.inserts += 1
+        errors = []
+        for index, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            if document["_id"] in self.documents:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.documents[document["_id"]] = document
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeDatabase:
+    """Motor database stand-in that can be switched off"""
+
+    def __init__(self):
+        self.down = False
+        self.inserts = 0
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection(self))
+
+    def count(self, name):
+        return len(self[name].documents)
+
+
+def spilled(path):
+    with open(path, encoding="utf-8") as f:
+        return [json_util.loads(line) for line in f if line.strip()]
+
+
+def test_records_are_flushed_in_bulk_as_snapshots():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehindWriter(db, flush_interval_ms=20, batch_size=100)
+        writer.start()
+        record = {"userId": "u1", "result": {"crop": "rice"}}
+        writer.submit("crop_predictions", [record] + [{"userId": "u1", "n": i} for i in range(9)])
+        # Changes after submit must not reach the stored record
+        record["result"]["crop"] = "maize"
+
+        await wait_for(lambda: db.count("crop_predictions") == 10)
+        assert db.inserts == 1
+        stored = list(db["crop_predictions"].documents.values())
+        assert stored[0]["result"] == {"crop": "rice"}
+        assert db["crop_predictions"].documents[record["_id"]] is not record
+        assert writer.stats()["written"] == 10
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_spill_when_down_and_replay_when_back(tmp_path):
+    async def main():
+        path = str(tmp_path / "spill.jsonl")
+        db = FakeDatabase()
+        db.down = True
+        writer = WriteBehindWriter(db, flush_interval_ms=5, spill_path=path, replay_interval_seconds=0.05)
+        writer.start()
+        writer.submit("crop_predictions", [{"userId": "u1", "n": i} for i in range(3)])
+
+        await wait_for(lambda: os.path.exists(path))
+        assert len(spilled(path)) == 3
+        assert writer.stats()["failed_flushes"] == 1
+
+        db.down = False
+        await wait_for(lambda: not os.path.exists(path))
+        assert db.count("crop_predictions") == 3
+        assert writer.stats()["replayed"] == 3
+        assert os.listdir(tmp_path) == []
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_queue_overflow_spills_instead_of_blocking(tmp_path):
+    async def main():
+        path = str(tmp_path / "spill.jsonl")
+        writer = WriteBehindWriter(FakeDatabase(), max_queue=2, spill_path=path)
+        writer.start()
+        writer.submit("crop_predictions", [{"n": i} for i in range(5)])
+        assert [entry["document"]["n"] for entry in spilled(path)] == [2, 3, 4]
+        assert writer.stats()["spilled"] == 3
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_duplicates_from_partial_write_count_as_written():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehindWriter(db, flush_interval_ms=5)
+        writer.start()
+        writer.submit("crop_predictions", [{"n": 1}])
+        await wait_for(lambda: db.count("crop_predictions") == 1)
+        # Same _id again, as a replay after a partial insert would send it
+        existing = next(iter(db["crop_predictions"].documents.values()))
+        writer.submit("crop_predictions", [existing, {"n": 2}])
+        await wait_for(lambda: writer.stats()["written"] == 3)
+        assert db.count("crop_predictions") == 2
+        assert writer.stats()["failed_flushes"] == 0
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_interrupted_replay_is_recovered_on_start(tmp_path):
+    async def main():
+        path = str(tmp_path / "spill.jsonl")
+        db = FakeDatabase()
+        # A crash mid-replay leaves the moved file behind
+        with open(f"{path}.123.replay", "w", encoding="utf-8") as f:
+            f.write(json_util.dumps({"collection": "crop_predictions", "document": {"_id": ObjectId(), "n": 1}}) + "\n")
+
+        writer = WriteBehindWriter(db, spill_path=path, replay_interval_seconds=0.05)
+        writer.start()
+        await wait_for(lambda: db.count("crop_predictions") == 1)
+        await wait_for(lambda: os.listdir(tmp_path) == [])
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_discard_drops_queued_and_spilled_records(tmp_path):
+    async def main():
+        path = str(tmp_path / "spill.jsonl")
+        db = FakeDatabase()
+        db.down = True
+        writer = WriteBehindWriter(db, flush_interval_ms=5, spill_path=path, replay_interval_seconds=60)
+        writer.start()
+        writer.submit("crop_predictions", [{"userId": "u1"}, {"userId": "u2"}])
+        await wait_for(lambda: os.path.exists(path))
+
+        writer.submit("crop_predictions", [{"userId": "u1"}])
+        writer.submit("yield_predictions", [{"userId": "u1"}, {"userId": "u2"}])
+        assert await writer.discard("u1", ["crop_predictions"]) == 2
+        assert await writer.discard("u1") == 1
+
+        db.down = False
+        await writer.close()
+        assert db.count("crop_predictions") == 0
+        assert [doc["userId"] for doc in db["yield_predictions"].documents.values()] == ["u2"]
+        assert [entry["document"]["userId"] for entry in spilled(path)] == ["u2"]
+
+    asyncio.run(main())
+
+
+def test_close_flushes_queued_records():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehindWriter(db, flush_interval_ms=10000, batch_size=2)
+        writer.start()
+        writer.submit("crop_predictions", [{"n": i} for i in range(5)])
+        await asyncio.sleep(0.01)
+        await writer.close()
+        assert db.count("crop_predictions") == 5
+
+    asyncio.run(main())
+
+
+def test_truncated_spill_line_is_quarantined(tmp_path):
+    async def main():
+        path = str(tmp_path / "spill.jsonl")
+        good = [json_util.dumps({"collection": "crop_predictions", "document": {"_id": ObjectId(), "userId": u}})
+                for u in ("u1", "u2")]
+        # A crash mid-write leaves the last line cut short
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(good) + "\n" + good[0][:20])
+
+        db = FakeDatabase()
+        db.down = True
+        writer = WriteBehindWriter(db, flush_interval_ms=5, spill_path=path, replay_interval_seconds=0.05)
+        writer.start()
+        # New spills start on a fresh line instead of extending the partial one
+        writer.submit("crop_predictions", [{"userId": "u3"}])
+        await wait_for(lambda: writer.stats()["spilled"] == 1)
+        assert await writer.discard("u2") == 1
+        assert writer.stats()["quarantined"] == 1
+        with open(f"{path}.bad", encoding="utf-8") as f:
+            assert f.read() == good[0][:20] + "\n"
+
+        db.down = False
+        await wait_for(lambda: not os.path.exists(path))
+        assert sorted(doc["userId"] for doc in db["crop_predictions"].documents.values()) == ["u1", "u3"]
+        assert not writer._task.done()
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_flusher_survives_unexpected_errors(tmp_path):
+    async def main():
+        path = str(tmp_path / "spill.jsonl")
+        db = FakeDatabase()
+        writer = WriteBehindWriter(db, flush_interval_ms=5, spill_path=path, replay_interval_seconds=0.05)
+        calls = []
+
+        async def broken_replay():
+            calls.append(1)
+            raise OSError("disk error")
+
+        writer._replay = broken_replay
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n")
+        writer.start()
+        await wait_for(lambda: len(calls) >= 2)
+        assert writer.stats()["last_error"] == "disk error"
+
+        os.remove(path)
+        writer.submit("crop_predictions", [{"n": 1}])
+        await wait_for(lambda: db.count("crop_predictions") == 1)
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_unwritable_spill_drops_instead_of_raising(tmp_path):
+    async def main():
+        blocker = tmp_path / "not-a-directory"
+        blocker.write_text("")
+        writer = WriteBehindWriter(FakeDatabase(), max_queue=1, spill_path=str(blocker / "spill.jsonl"))
+        writer.start()
+        writer.submit("crop_predictions", [{"n": 1}, {"n": 2}])
+        assert writer.stats()["dropped"] == 1
+        await writer.close()
+
+    asyncio.run(main())
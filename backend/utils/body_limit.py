@@ -0,0 +1,56 @@
+"""
+Request body size limits enforced before the body is parsed
+Multipart forms are spooled to disk by the framework before a handler runs, so a
+per-file check inside the handler comes too late. This ASGI middleware refuses
+an oversized Content-Length up front and stops reading a streamed body as soon
+as it passes the limit
+"""
+import json
+from starlette.exceptions import HTTPException
+
+
+class BodySizeLimitMiddleware:
+    """`limits` maps request paths to their maximum body size in bytes; other paths pass through"""
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await _reject(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI re-raises HTTPException as a 413 response
+                    raise HTTPException(status_code=413, detail=_detail(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _detail(limit: int) -> str:
+    return f"Request body exceeds the {limit} byte limit"
+
+
+async def _reject(send, limit: int):
+    body = json.dumps({"detail": _detail(limit)}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
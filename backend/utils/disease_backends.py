@@ -0,0 +1,260 @@
+"""
+Inference backends for the leaf disease CNN
+The Keras model is the reference path; the TFLite backend serves a float16 or int8
+quantized copy that is converted once and cached next to the source model. int8 needs
+labelled calibration images and its cache file is tied to the set it was calibrated on
+
+Accuracy check against a validation folder laid out as <dir>/<class_name>/<image>:
+    python utils/disease_backends.py --model models/new_leaf_detection/balanced_cnn_lowmem.keras \
+        --validation-dir path/to/val --quantization int8
+"""
+import os
+import json
+import hashlib
+import time
+import numpy as np
+from PIL import Image
+
+QUANTIZATION_MODES = ("float16", "int8")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class KerasBackend:
+    """
+    Float32 reference path. With an input_size the forward pass is wrapped in a
+    tf.function with a fixed [None, height, width, 3] signature, so it is traced once
+    """
+
+    name = "keras"
+
+    def __init__(self, model, input_size: tuple = None):
+        self.model = model
+        self._forward = None
+        if input_size is not None:
+            import tensorflow as tf
+            self._forward = tf.function(
+                lambda images: model(images, training=False),
+                input_signature=[tf.TensorSpec([None, *input_size, 3], tf.float32)]
+            )
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        if self._forward is not None:
+            return self._forward(batch).numpy()
+        return np.asarray(self.model(batch, training=False))
+
+
+class TFLiteBackend:
+    """
+    Serves a converted .tflite artifact through the lightest interpreter available:
+    ai_edge_litert, then tflite_runtime, then the one bundled with TensorFlow.
+    Each size in `batch_sizes` gets its own interpreter with tensors allocated up front,
+    so moving between batch buckets never re-plans them; other sizes share a spare
+    interpreter that is resized on demand.
+    Not thread-safe; the service calls it from a single model thread
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = None, batch_sizes: list = ()):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreter_cls = _load_interpreter_class()
+        self._spare = self._allocate()
+        self._by_size = {int(size): self._allocate(int(size)) for size in batch_sizes}
+
+    def _allocate(self, batch_size: int = None) -> tuple:
+        """(interpreter, input details, output details), resized to batch_size if given"""
+        interpreter = self._interpreter_cls(model_path=self.model_path, num_threads=self.num_threads)
+        if batch_size is not None:
+            input_detail = interpreter.get_input_details()[0]
+            interpreter.resize_tensor_input(input_detail['index'], [batch_size, *input_detail['shape'][1:]])
+        interpreter.allocate_tensors()
+        return interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0]
+
+    @property
+    def input_size(self) -> tuple:
+        """(height, width) of the converted model's input"""
+        shape = self._spare[1]['shape']
+        return int(shape[1]), int(shape[2])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        slot = self._by_size.get(batch.shape[0])
+        if slot is None:
+            interpreter, input_detail, _ = slot = self._spare
+            if batch.shape[0] != input_detail['shape'][0]:
+                interpreter.resize_tensor_input(input_detail['index'], list(batch.shape))
+                interpreter.allocate_tensors()
+                slot = self._spare = (
+                    interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0]
+                )
+        interpreter, input_detail, output_detail = slot
+        interpreter.set_tensor(input_detail['index'], np.ascontiguousarray(batch, dtype=np.float32))
+        interpreter.invoke()
+        return interpreter.get_tensor(output_detail['index']).copy()
+
+
+def _load_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+def tflite_variant(quantization: str, calibration_dir: str = None) -> str:
+    """
+    Tag for a converted model: the quantization mode, plus for int8 a fingerprint of the
+    calibration images (names, sizes, mtimes), e.g. 'int8-3f9c2a7b10'. Raises ValueError
+    for int8 without calibration images rather than calibrating on noise
+    """
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_MODES}")
+    if quantization != "int8":
+        return quantization
+    paths = _calibration_paths(calibration_dir)
+    if not paths:
+        raise ValueError("int8 quantization needs calibration images in DISEASE_VALIDATION_DIR; use float16 otherwise")
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.relpath(path, calibration_dir)}|{stat.st_size}|{int(stat.st_mtime)}\n".encode())
+    return f"int8-{digest.hexdigest()[:10]}"
+
+
+def tflite_cache_path(model_path: str, variant: str, cache_dir: str = None) -> str:
+    """Location of the cached artifact, e.g. models/.../balanced_cnn_lowmem.float16.tflite"""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    directory = cache_dir or os.path.dirname(model_path)
+    return os.path.join(directory, f"{stem}.{variant}.tflite")
+
+
+def convert_to_tflite(model, model_path: str, quantization: str = "float16", cache_dir: str = None,
+                      input_size: tuple = (224, 224), calibration_dir: str = None) -> str:
+    """
+    Convert the Keras model to a quantized TFLite artifact unless a cached one is newer
+    than the source model. int8 calibrates on up to 100 images from calibration_dir
+    """
+    variant = tflite_variant(quantization, calibration_dir)
+    output_path = tflite_cache_path(model_path, variant, cache_dir)
+    if os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(model_path):
+        return output_path
+
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        calibration_images = _calibration_images(calibration_dir, input_size)
+
+        def representative_dataset():
+            for image in calibration_images:
+                yield [image[np.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+
+    started = time.perf_counter()
+    tflite_model = converter.convert()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    print(f" Converted {os.path.basename(model_path)} to {variant} TFLite "
+          f"({len(tflite_model) / 1e6:.1f} MB, {time.perf_counter() - started:.1f}s)")
+    return output_path
+
+
+def _calibration_paths(calibration_dir: str, limit: int = 100) -> list:
+    return [path for path, _ in iter_labelled_images(calibration_dir)][:limit]
+
+
+def _calibration_images(calibration_dir: str, input_size: tuple) -> list:
+    return [load_image(path, input_size) for path in _calibration_paths(calibration_dir)]
+
+
+def iter_labelled_images(validation_dir: str):
+    """Yield (path, class_name) for a <dir>/<class_name>/<image> folder"""
+    if not validation_dir or not os.path.isdir(validation_dir):
+        return
+    for class_name in sorted(os.listdir(validation_dir)):
+        class_dir = os.path.join(validation_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(class_dir, filename), class_name
+
+
+def load_image(path: str, input_size: tuple) -> np.ndarray:
+    """Load one image as a normalized float32 (height, width, 3) array, like the service does"""
+    with Image.open(path) as image:
+        image.draft('RGB', (input_size[1], input_size[0]))
+        image = image.convert('RGB').resize((input_size[1], input_size[0]))
+        return np.asarray(image, dtype=np.float32) / np.float32(255.0)
+
+
+def compare_backends(reference, candidate, validation_dir: str, class_names: list,
+                     input_size: tuple, batch_size: int = 32) -> dict:
+    """
+    Run both backends over a labelled validation folder and report
+    top-1 accuracy of each, the delta, agreement rate and per-image latency
+    """
+    samples = list(iter_labelled_images(validation_dir))
+    class_index = {name: i for i, name in enumerate(class_names)}
+    labels = np.array([class_index.get(name, -1) for _, name in samples])
+
+    predictions = {}
+    timings = {}
+    for backend in (reference, candidate):
+        predicted = []
+        elapsed = 0.0
+        for start in range(0, len(samples), batch_size):
+            batch = np.stack([load_image(path, input_size) for path, _ in samples[start:start + batch_size]])
+            started = time.perf_counter()
+            predicted.append(np.argmax(backend.predict(batch), axis=1))
+            elapsed += time.perf_counter() - started
+        predictions[backend.name] = np.concatenate(predicted) if predicted else np.array([], dtype=int)
+        timings[backend.name] = elapsed
+
+    known = labels >= 0
+    report = {"images": len(samples), "labelled": int(known.sum())}
+    for backend in (reference, candidate):
+        correct = predictions[backend.name][known] == labels[known]
+        report[f"{backend.name}_accuracy"] = round(float(correct.mean()), 4) if known.any() else None
+        report[f"{backend.name}_ms_per_image"] = (
+            round(timings[backend.name] * 1000 / len(samples), 3) if samples else None
+        )
+    if known.any():
+        report["accuracy_delta"] = round(report[f"{candidate.name}_accuracy"] - report[f"{reference.name}_accuracy"], 4)
+    if samples:
+        report["agreement"] = round(float((predictions[reference.name] == predictions[candidate.name]).mean()), 4)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    from tensorflow import keras
+
+    parser = argparse.ArgumentParser(description="Convert the disease CNN to TFLite and compare accuracy")
+    parser.add_argument("--model", required=True, help="Path to the source .keras model")
+    parser.add_argument("--validation-dir", required=True, help="Folder laid out as <class_name>/<image>")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default="float16")
+    parser.add_argument("--class-names", help="JSON list of class names (defaults to class_names.json beside the model)")
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    size = tuple(int(dim) for dim in model.input_shape[1:3])
+    class_names_path = args.class_names or os.path.join(os.path.dirname(args.model), "class_names.json")
+    with open(class_names_path, 'r') as f:
+        names = json.load(f)
+
+    tflite_path = convert_to_tflite(model, args.model, args.quantization, input_size=size,
+                                    calibration_dir=args.validation_dir)
+    result = compare_backends(KerasBackend(model), TFLiteBackend(tflite_path), args.validation_dir, names, size)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,97 @@
+"""
+Precomputed metadata for the disease CNN's output classes
+Class names are parsed and matched to a recommendation record once at model load,
+so turning a predicted class index into a response is plain array indexing.
+Recommendations live in disease_recommendations.json and can be edited without a deploy
+"""
+import json
+import os
+import numpy as np
+
+DEFAULT_RECOMMENDATIONS_PATH = os.path.join(os.path.dirname(__file__), "disease_recommendations.json")
+
+
+def parse_disease_name(class_name: str):
+    """Parse disease class name into plant and disease"""
+    try:
+        parts = class_name.split('___')
+        if len(parts) == 2:
+            plant = parts[0].replace('_', ' ').replace('(', '').replace(')', '')
+            disease = parts[1].replace('_', ' ')
+            return plant, disease
+        return class_name, "Unknown"
+    except Exception:
+        return class_name, "Unknown"
+
+
+def load_recommendations(path: str = None) -> dict:
+    """
+    Read the recommendation table: {"healthy": {...}, "default": {...}, "diseases": {name: {...}}}
+    A disease entry applies to every class whose disease name contains the key (case-insensitive)
+    """
+    with open(path or DEFAULT_RECOMMENDATIONS_PATH, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+    for key in ("healthy", "default", "diseases"):
+        if key not in table:
+            raise ValueError(f"Recommendation table is missing '{key}'")
+    return table
+
+
+def match_recommendation(disease: str, is_healthy: bool, table: dict) -> dict:
+    """Recommendation record for one parsed class; first matching disease key wins"""
+    if is_healthy:
+        return table["healthy"]
+    for key, value in table["diseases"].items():
+        if key.lower() in disease.lower():
+            return value
+    return table["default"]
+
+
+class DiseaseIndex:
+    """
+    Class index -> (plant, disease, is_healthy, recommendation), stored as parallel
+    numpy arrays so a whole vector of predicted indices can be looked up at once
+    """
+
+    def __init__(self, class_names: list, recommendations: dict, num_outputs: int = None):
+        # Outputs the class list does not name keep the old Class_<i> placeholder
+        names = list(class_names or [])
+        for idx in range(len(names), num_outputs or 0):
+            names.append(f"Class_{idx}")
+        parsed = [parse_disease_name(name) for name in names]
+
+        self.class_names = names
+        self.plants = np.array([plant for plant, _ in parsed], dtype=object)
+        self.diseases = np.array([disease for _, disease in parsed], dtype=object)
+        self.is_healthy = np.array(['healthy' in disease.lower() for _, disease in parsed], dtype=bool)
+        self.recommendations = np.empty(len(names), dtype=object)
+        for idx, (_, disease) in enumerate(parsed):
+            self.recommendations[idx] = match_recommendation(disease, bool(self.is_healthy[idx]), recommendations)
+
+    def __len__(self) -> int:
+        return len(self.class_names)
+
+
+def top_k(probabilities: np.ndarray, k: int):
+    """
+    Row-wise top-k of an (n, classes) probability matrix without a full sort:
+    argpartition picks the k best per row, then only those k are ordered.
+    Returns (indices, scores), both (n, k) and sorted by descending score
+    """
+    k = max(1, min(k, probabilities.shape[1]))
+    candidates = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    scores = np.take_along_axis(probabilities, candidates, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def build_disease_index(class_names: list, num_outputs: int = None, recommendations_path: str = None) -> DiseaseIndex:
+    """Load the recommendation table and index every class; falls back to the bundled table"""
+    try:
+        table = load_recommendations(recommendations_path)
+    except Exception as e:
+        if not recommendations_path:
+            raise
+        print(f"! Failed to load recommendations from {recommendations_path}: {e}; using bundled table")
+        table = load_recommendations()
+    return DiseaseIndex(class_names, table, num_outputs)
@@ -0,0 +1,126 @@
+"""
+Recent prediction history per user and prediction type
+Gemini notifications and reports only need the last few predictions, so each user
+keeps a small ring buffer per collection. Buffers are filled from MongoDB on first
+access, updated in place on every new prediction and evicted LRU over users.
+A prediction for a user who is not cached starts a buffer that is merged with
+MongoDB on its first read, so records still waiting in the write-behind queue are
+never missing from it. The cache is per process: only collections this service
+writes are cached
+"""
+import asyncio
+from collections import deque
+from datetime import datetime
+from utils.result_cache import LRUCache
+
+
+class _Buffer(deque):
+    """Newest-first records; `reconciled` is False until MongoDB's records are merged in"""
+    reconciled = True
+
+
+class RecentHistoryCache:
+    """
+    Newest-first deque of the last `depth` records for each (user, collection)
+    in `collections`; other collections are read straight from the database
+    """
+
+    def __init__(self, db, collections: list, depth: int = 6, max_users: int = 10000,
+                 read_timeout_ms: float = 300.0):
+        self.db = db
+        self.collections = set(collections)
+        self.depth = max(1, depth)
+        self.read_timeout = read_timeout_ms / 1000.0 if read_timeout_ms and read_timeout_ms > 0 else None
+        self.users = LRUCache(max_users)
+        self.hits = 0
+        self.loads = 0
+
+    async def _query(self, collection_name: str, user_id: str) -> list:
+        return await self.db[collection_name].find(
+            {"userId": user_id}
+        ).sort("timestamp", -1).limit(self.depth).to_list(length=self.depth)
+
+    async def _buffer(self, collection_name: str, user_id: str) -> deque:
+        buffers = self.users.get(user_id)
+        buffer = buffers.get(collection_name) if buffers is not None else None
+        if buffer is not None and buffer.reconciled:
+            self.hits += 1
+            return buffer
+
+        records = await self._query(collection_name, user_id)
+        self.loads += 1
+        # Records added before or during the query are merged in; _id drops the
+        # ones the write-behind flusher already wrote
+        buffers = self.users.get(user_id)
+        if buffers is None:
+            buffers = {}
+            self.users.set(user_id, buffers)
+        buffer = _Buffer(self._merge(buffers.get(collection_name, ()), records), maxlen=self.depth)
+        buffers[collection_name] = buffer
+        return buffer
+
+    def _merge(self, cached, loaded: list) -> list:
+        seen, merged = set(), []
+        for record in [*cached, *loaded]:
+            record_id = record.get("_id")
+            if record_id is not None:
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+            merged.append(record)
+        merged.sort(key=lambda record: record.get("timestamp") or datetime.min, reverse=True)
+        return merged[:self.depth]
+
+    async def recent(self, collection_name: str, user_id: str, limit: int = None) -> list:
+        """Up to `limit` most recent records, newest first, without _id"""
+        if collection_name not in self.collections:
+            records = await self._query(collection_name, user_id)
+        else:
+            records = list(await self._buffer(collection_name, user_id))
+        records = records[:limit] if limit is not None else records
+        return [{key: value for key, value in record.items() if key != "_id"} for record in records]
+
+    async def context(self, collection_name: str, user_id: str, limit: int = 5) -> list:
+        """
+        Recent records for Gemini context, or [] when they cannot be read within the
+        read timeout, so a slow or unreachable MongoDB never holds up a prediction
+        """
+        try:
+            return await asyncio.wait_for(self.recent(collection_name, user_id, limit), self.read_timeout)
+        except Exception as e:
+            print(f"⚠ Prediction history unavailable, notifying without it: {e!r}")
+            return []
+
+    def add(self, collection_name: str, user_id: str, records: list):
+        """
+        Push new records (oldest first, with the _id the writer gave them) onto the
+        user's buffer, starting one to be merged with MongoDB on first read if needed
+        """
+        if collection_name not in self.collections or user_id is None:
+            return
+        buffers = self.users.peek(user_id)
+        if buffers is None:
+            buffers = {}
+            self.users.set(user_id, buffers)
+        buffer = buffers.get(collection_name)
+        if buffer is None:
+            buffer = buffers[collection_name] = _Buffer(maxlen=self.depth)
+            buffer.reconciled = False
+        for record in records:
+            buffer.appendleft(record)
+
+    def invalidate(self, user_id: str):
+        self.users.pop(user_id)
+
+    def stats(self) -> dict:
+        users = self.users.stats()
+        lookups = self.hits + self.loads
+        return {
+            "depth": self.depth,
+            "users": users["entries"],
+            "max_users": users["max_entries"],
+            "evictions": users["evictions"],
+            "hits": self.hits,
+            "loads": self.loads,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,88 @@
+"""
+Cursor-paginated prediction history across all prediction collections
+One aggregation starts from the first collection and pulls in the others with
+$unionWith; every branch seeks past the cursor on its (userId, timestamp, _id)
+index and returns at most one page, so each page costs the same however long
+the user's history is. Only the fields the dashboard shows are projected
+"""
+import base64
+from datetime import datetime
+from bson import ObjectId
+
+# Prediction type -> collection, in union order
+HISTORY_COLLECTIONS = {
+    "crop": "crop_predictions",
+    "fertilizer": "fertilizer_predictions",
+    "yield": "yield_predictions",
+    "disease": "disease_predictions"
+}
+
+HISTORY_PROJECTION = {
+    "_id": 1,
+    "predictionType": 1,
+    "timestamp": 1,
+    "prediction_date": 1,
+    "timeframe": 1,
+    "input": 1,
+    "result.recommended_crop": 1,
+    "result.recommended_fertilizer": 1,
+    "result.predicted_yield": 1,
+    "result.yield_unit": 1,
+    "result.plant": 1,
+    "result.disease": 1,
+    "result.is_healthy": 1,
+    "result.severity": 1,
+    "result.confidence": 1
+}
+
+HISTORY_SORT = {"timestamp": -1, "_id": -1}
+
+
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    """Opaque cursor for the last item of a page"""
+    raw = f"{timestamp.isoformat()}|{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(timestamp, ObjectId) from encode_cursor; raises ValueError when malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, object_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _branch(user_id: str, prediction_type: str, page_size: int, after) -> list:
+    match = {"userId": user_id}
+    if after is not None:
+        timestamp, object_id = after
+        match["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": object_id}}
+        ]
+    return [
+        {"$match": match},
+        {"$sort": HISTORY_SORT},
+        {"$limit": page_size},
+        {"$project": {**HISTORY_PROJECTION, "type": {"$literal": prediction_type}}}
+    ]
+
+
+def history_pipeline(user_id: str, prediction_types: list, page_size: int, after=None):
+    """
+    (collection to aggregate on, pipeline) for one page of the merged history,
+    newest first. `after` is a decoded cursor; ask for one extra item to learn
+    whether another page exists
+    """
+    first, *others = prediction_types
+    pipeline = _branch(user_id, first, page_size, after)
+    for prediction_type in others:
+        pipeline.append({"$unionWith": {
+            "coll": HISTORY_COLLECTIONS[prediction_type],
+            "pipeline": _branch(user_id, prediction_type, page_size, after)
+        }})
+    if others:
+        pipeline += [{"$sort": HISTORY_SORT}, {"$limit": page_size}]
+    return HISTORY_COLLECTIONS[first], pipeline
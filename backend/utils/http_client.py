@@ -0,0 +1,64 @@
+"""
+Shared outbound HTTP client for webhook delivery
+One pooled httpx.AsyncClient per service keeps connections alive between alerts;
+ConnectionStats counts how many requests rode on an already-open connection
+"""
+import httpx
+
+
+class ConnectionStats:
+    """
+    httpcore trace hook: pass `extensions={"trace": stats.trace}` on each request.
+    A request that did not open a TCP connection reused a pooled one
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.failures = 0
+
+    async def trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event_name.endswith(".send_request_headers.started"):
+            self.requests += 1
+        elif event_name == "connection.connect_tcp.failed":
+            self.failures += 1
+
+    def stats(self) -> dict:
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "connect_failures": self.failures,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0
+        }
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_async_client(timeout: float = 5.0, max_connections: int = 20, max_keepalive: int = 10,
+                        keepalive_expiry: float = 30.0, http2: bool = False) -> httpx.AsyncClient:
+    """
+    Build the pooled client. HTTP/2 needs the optional `h2` package
+    (pip install "httpx[http2]"); without it the client stays on HTTP/1.1 keep-alive
+    """
+    if http2 and not http2_available():
+        print("⚠ HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        timeout=timeout,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
@@ -0,0 +1,77 @@
+"""
+Bounded executor for blocking model inference
+Keeps synchronous sklearn / XGBoost / LightGBM calls off the asyncio event loop
+and sheds load instead of queuing without limit
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class InferenceExecutor:
+    """
+    Thread pool (default) or process pool with a hard cap on in-flight jobs
+    Boosters release the GIL during predict, so threads scale for them; the process
+    pool is for models that do not, and needs an initializer that loads the models
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 64, use_processes: bool = False,
+                 initializer=None, initargs: tuple = ()):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        if use_processes:
+            self._pool = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls, initializer=None, initargs: tuple = ()):
+        """Build an executor from INFERENCE_WORKERS, INFERENCE_QUEUE_DEPTH and INFERENCE_USE_PROCESSES"""
+        return cls(
+            max_workers=int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+            max_queue=int(os.getenv("INFERENCE_QUEUE_DEPTH", "64")),
+            use_processes=os.getenv("INFERENCE_USE_PROCESSES", "false").lower() in ("1", "true", "yes"),
+            initializer=initializer,
+            initargs=initargs
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool, or raise ExecutorSaturated if the backlog is full"""
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self._in_flight >= self.capacity:
+            self._rejected += 1
+            raise ExecutorSaturated(f"Inference queue full ({self.capacity} jobs in flight)")
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": "process" if self.use_processes else "thread",
+            "workers": self.max_workers,
+            "queue_depth": self.max_queue,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "rejected": self._rejected
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
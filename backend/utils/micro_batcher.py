@@ -0,0 +1,185 @@
+"""
+Adaptive micro-batching for per-request model calls
+Concurrent requests are coalesced into one vectorized model pass and the
+per-item results are fanned back out to the awaiting handlers
+"""
+import asyncio
+import time
+from collections import Counter, deque
+import numpy as np
+from utils.inference_executor import ExecutorSaturated
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches of up to max_batch_size
+
+    When no batch is running, the first item is dispatched immediately so an idle
+    service adds no latency. While batches are in flight, the collector waits up to
+    max_wait_ms for more items, so batch size grows with load.
+    `run_batch` is an async callable taking a list of items and returning
+    a list of results of the same length and order.
+    With max_pending_items set, submit() raises ExecutorSaturated once that many
+    items are queued or running, so overload is shed instead of waiting forever.
+    """
+
+    def __init__(self, name: str, run_batch, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 max_concurrent_batches: int = 1, max_pending_items: int = None, latency_window: int = 2048):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.max_pending_items = max_pending_items if max_pending_items and max_pending_items > 0 else None
+
+        self._queue = None
+        self._collector = None
+        # Batch taken off the queue but not dispatched yet, failed by close()
+        self._collecting = []
+        self._closing = False
+        self._slots = None
+        self._batches_in_flight = 0
+        self._batch_tasks = set()
+        self._pending = 0
+
+        self._latencies_ms = deque(maxlen=latency_window)
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._rejected = 0
+
+    def start(self):
+        """Start the collector task on the running event loop"""
+        if self._collector is None:
+            self._closing = False
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._collector = asyncio.create_task(self._collect(), name=f"{self.name}-batcher")
+
+    async def close(self):
+        """Stop collecting, fail items not yet dispatched and wait for batches already running"""
+        if self._collector is not None:
+            # The flag stops the collector even if wait_for swallows the cancel
+            self._closing = True
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+            unfinished, self._collecting = self._collecting, []
+            while not self._queue.empty():
+                unfinished.append(self._queue.get_nowait())
+            for _, future, _ in unfinished:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"{self.name} batcher is shutting down"))
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+
+    async def submit(self, item):
+        """Queue one item and wait for its result"""
+        self.start()
+        if self.max_pending_items is not None and self._pending >= self.max_pending_items:
+            self._rejected += 1
+            raise ExecutorSaturated(f"{self.name} batcher full ({self._pending} items pending)")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        self._pending += 1
+        try:
+            return await future
+        finally:
+            self._pending -= 1
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            batch = self._collecting = [await self._queue.get()]
+
+            # Only hold the batch open when the model is already busy
+            deadline = loop.time() + (self.max_wait if self._batches_in_flight else 0.0)
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._slots.acquire()
+            self._batches_in_flight += 1
+            task = asyncio.create_task(self._dispatch(batch))
+            self._collecting = []
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _dispatch(self, batch: list):
+        try:
+            items = [item for item, _, _ in batch]
+            try:
+                results = await self.run_batch(items)
+            except Exception as e:
+                self._errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            now = time.perf_counter()
+            for (_, future, submitted_at), result in zip(batch, results):
+                self._latencies_ms.append((now - submitted_at) * 1000.0)
+                if not future.done():
+                    future.set_result(result)
+
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[_size_bucket(len(batch))] += 1
+        finally:
+            self._batches_in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        latencies = np.fromiter(self._latencies_ms, dtype=float)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending": self._pending,
+            "max_pending_items": self.max_pending_items,
+            "rejected": self._rejected,
+            "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "batch_size_histogram": {
+                label: self._batch_sizes[label] for label in _bucket_labels(self.max_batch_size)
+            },
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)), 3) if latencies.size else None,
+                "p99": round(float(np.percentile(latencies, 99)), 3) if latencies.size else None,
+                "samples": int(latencies.size)
+            }
+        }
+
+
+def _size_bucket(size: int) -> str:
+    """Power-of-two histogram bucket label for a batch size, e.g. 5 -> '5-8'"""
+    upper = 1
+    while upper < size:
+        upper *= 2
+    lower = upper // 2 + 1 if upper > 1 else 1
+    return str(upper) if lower == upper else f"{lower}-{upper}"
+
+
+def _bucket_labels(max_batch_size: int) -> list:
+    labels = []
+    upper = 1
+    while True:
+        labels.append(_size_bucket(upper))
+        if upper >= max_batch_size:
+            return labels
+        upper *= 2
@@ -0,0 +1,45 @@
+"""
+Shared async MongoDB connection setup for the API services
+Both services build their Motor client here so pool size and timeouts are
+configured the same way from the environment
+"""
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+def _optional_int(name: str):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def mongo_client_options() -> dict:
+    """Pool and timeout settings for the Motor client; unset values keep the driver defaults"""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "10000")),
+        "socketTimeoutMS": _optional_int("MONGODB_SOCKET_TIMEOUT_MS"),
+        "waitQueueTimeoutMS": _optional_int("MONGODB_WAIT_QUEUE_TIMEOUT_MS"),
+        "maxIdleTimeMS": _optional_int("MONGODB_MAX_IDLE_TIME_MS")
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+async def connect_mongo(uri: str, db_name: str, collections: list):
+    """
+    Open a pooled Motor client, check the server is reachable and create any
+    missing collections. Returns (client, database); raises if the server is down
+    """
+    client = AsyncIOMotorClient(uri, **mongo_client_options())
+    try:
+        await client.server_info()
+        db = client[db_name]
+        existing = set(await db.list_collection_names())
+        for name in collections:
+            if name not in existing:
+                await db.create_collection(name)
+    except Exception:
+        client.close()
+        raise
+    return client, db
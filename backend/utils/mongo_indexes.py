@@ -0,0 +1,83 @@
+"""
+Idempotent index provisioning for the prediction and profile collections
+Every history read filters on userId and sorts on timestamp, so each prediction
+collection gets a compound (userId, timestamp desc, _id desc) index; _id breaks ties for
+keyset pagination. Profiles are unique per user
+"""
+from pymongo import ASCENDING, DESCENDING
+
+PREDICTION_INDEX = [("userId", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]
+PREDICTION_INDEX_NAME = "userId_1_timestamp_-1__id_-1"
+PROFILE_INDEX_NAME = "userId_1_unique"
+
+
+async def ensure_prediction_indexes(db, collection_names: list):
+    """Create the history index on each prediction collection; a no-op when it already exists"""
+    for name in collection_names:
+        await db[name].create_index(PREDICTION_INDEX, name=PREDICTION_INDEX_NAME)
+
+
+async def ensure_profile_index(db):
+    """Unique userId on user_profiles; existing duplicates are reported instead of failing startup"""
+    try:
+        await db.user_profiles.create_index([("userId", ASCENDING)], name=PROFILE_INDEX_NAME, unique=True)
+        return True
+    except Exception as e:
+        print(f"⚠ Could not create unique index on user_profiles.userId (duplicate profiles or a conflicting index?): {e}")
+        return False
+
+
+def _plan_stages(plan: dict) -> list:
+    """Flatten a winning plan into its stage names, root first"""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        if plan.get("indexName"):
+            stages[-1] = f"{plan['stage']}({plan['indexName']})"
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+async def check_history_plan(collection) -> dict:
+    """
+    Explain the history query shape (userId filter, timestamp sort, small limit)
+    and report whether it is served by the index without a collection scan or in-memory sort
+    """
+    explanation = await collection.find(
+        {"userId": "__index_check__"}, {"_id": 0}
+    ).sort("timestamp", DESCENDING).limit(5).explain()
+    planner = explanation.get("queryPlanner", {})
+    # Newer servers nest the plan under queryPlan for the slot-based engine
+    winning = planner.get("winningPlan", {})
+    winning = winning.get("queryPlan", winning)
+    stages = [stage for stage in _plan_stages(winning) if stage]
+    uses_index = any(stage.startswith("IXSCAN") for stage in stages)
+    blocking_sort = any(stage in ("SORT", "COLLSCAN") for stage in stages)
+    return {
+        "collection": collection.name,
+        "stages": stages,
+        "index_scan": uses_index and not blocking_sort
+    }
+
+
+async def provision_indexes(db, prediction_collections: list, profiles: bool = False):
+    """
+    Create indexes and log the history query plan for each prediction collection
+    Failures are logged, never raised: the service still works without indexes, only slower
+    """
+    try:
+        await ensure_prediction_indexes(db, prediction_collections)
+    except Exception as e:
+        print(f"⚠ Could not create history indexes: {e}")
+    if profiles:
+        await ensure_profile_index(db)
+    for name in prediction_collections:
+        try:
+            plan = await check_history_plan(db[name])
+        except Exception as e:
+            print(f"⚠ Could not explain history query on {name}: {e}")
+            continue
+        if plan["index_scan"]:
+            print(f"✓ {name} history reads use {' <- '.join(plan['stages'])}")
+        else:
+            print(f"⚠ {name} history reads are not index-backed: {' <- '.join(plan['stages'])}")
@@ -0,0 +1,139 @@
+"""
+Prediction cache for the tabular models
+Keys combine the model version with inputs rounded to a fixed precision, so nearly
+identical soil readings share one ensemble pass. An in-process LRU sits in front of
+an optional Redis-compatible store shared between replicas
+"""
+import json
+from collections import Counter
+from utils.result_cache import LRUCache
+
+
+def quantize_inputs(values: dict, precision: int) -> str:
+    """Canonical key fragment: fields in name order, numbers rounded to `precision` decimals"""
+    parts = []
+    for name in sorted(values):
+        value = values[name]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = f"{round(float(value), precision):.{precision}f}"
+        parts.append(f"{name}={value}")
+    return "|".join(parts)
+
+
+def connect_redis(url: str):
+    """Async client for a Redis-compatible server, or None when redis-py is not installed"""
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        print("⚠ TABULAR_CACHE_REDIS_URL is set but the redis package is not installed; using in-process cache only")
+        return None
+    return redis.from_url(url)
+
+
+class PredictionCache:
+    """
+    Two-level cache for one model. Values must be JSON-serializable; hit and miss
+    counters are kept per endpoint so single and batch traffic can be told apart
+    """
+
+    def __init__(self, name: str, model_version: str, precision: int = 1, max_entries: int = 4096,
+                 ttl_seconds: float = None, redis_client=None):
+        self.name = name
+        self.model_version = model_version
+        self.precision = precision
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.local = LRUCache(max_entries, ttl_seconds)
+        self.redis = redis_client
+        self._hits = Counter()
+        self._misses = Counter()
+        self._shared_hits = 0
+        self._shared_errors = 0
+
+    def key(self, values: dict) -> str:
+        return f"tabular:{self.name}:{self.model_version}:{quantize_inputs(values, self.precision)}"
+
+    async def get(self, key: str, endpoint: str):
+        value = self.local.get(key)
+        if value is None and self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except Exception:
+                self._shared_errors += 1
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self._shared_hits += 1
+        if value is None:
+            self._misses[endpoint] += 1
+        else:
+            self._hits[endpoint] += 1
+        return value
+
+    async def set(self, key: str, value):
+        self.local.set(key, value)
+        if self.redis is not None:
+            try:
+                ttl = int(self.ttl_seconds) if self.ttl_seconds else None
+                await self.redis.set(key, json.dumps(value), ex=ttl)
+            except Exception:
+                self._shared_errors += 1
+
+    async def get_many(self, keys: list, endpoint: str) -> list:
+        """
+        Values for many keys, None where missing. Local lookups are plain dict
+        reads; only the local misses go to the shared store, in one MGET
+        """
+        values = [self.local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and self.redis is not None:
+            try:
+                raw_values = await self.redis.mget([keys[i] for i in missing])
+            except Exception:
+                self._shared_errors += 1
+                raw_values = [None] * len(missing)
+            for i, raw in zip(missing, raw_values):
+                if raw is not None:
+                    values[i] = json.loads(raw)
+                    self.local.set(keys[i], values[i])
+                    self._shared_hits += 1
+        hits = sum(value is not None for value in values)
+        self._hits[endpoint] += hits
+        self._misses[endpoint] += len(values) - hits
+        return values
+
+    async def set_many(self, keys: list, values: list):
+        """Store many entries locally and write them to the shared store in one pipeline"""
+        for key, value in zip(keys, values):
+            self.local.set(key, value)
+        if self.redis is not None and keys:
+            try:
+                ttl = int(self.ttl_seconds) if self.ttl_seconds else None
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, value in zip(keys, values):
+                        pipe.set(key, json.dumps(value), ex=ttl)
+                    await pipe.execute()
+            except Exception:
+                self._shared_errors += 1
+
+    def stats(self) -> dict:
+        endpoints = {}
+        for endpoint in sorted(set(self._hits) | set(self._misses)):
+            lookups = self._hits[endpoint] + self._misses[endpoint]
+            endpoints[endpoint] = {
+                "hits": self._hits[endpoint],
+                "misses": self._misses[endpoint],
+                "hit_ratio": round(self._hits[endpoint] / lookups, 4) if lookups else 0.0
+            }
+        local = self.local.stats()
+        return {
+            "model_version": self.model_version,
+            "precision": self.precision,
+            "entries": local["entries"],
+            "max_entries": local["max_entries"],
+            "evictions": local["evictions"],
+            "shared": self.redis is not None,
+            "shared_hits": self._shared_hits,
+            "shared_errors": self._shared_errors,
+            "endpoints": endpoints
+        }
@@ -0,0 +1,66 @@
+"""
+Bounded in-process result cache
+LRU eviction over a max entry count, with an optional per-entry time-to-live
+"""
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """LRU + TTL cache with hit/miss counters; meant to be used from the event loop thread"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value or None, refreshing its LRU position on a hit"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, key):
+        """Return the cached value or None without touching LRU order or counters"""
+        entry = self._entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+            return entry[0]
+        return None
+
+    def pop(self, key):
+        """Drop one entry; returns its value or None"""
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,247 @@
+"""
+Vectorized inference helpers for the stacked tabular ensembles
+Every helper works on a whole feature matrix, so a single request is just a batch of one
+"""
+from collections import Counter
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+# Serialized ensemble bundles, keyed by model kind
+MODEL_FILES = {
+    "crop": "crop_recommendation_ensemble.pkl",
+    "fertilizer": "fertilizer_recommendation_ensemble.pkl",
+    "yield": "yield_prediction_ensemble.pkl"
+}
+
+# Ensembles loaded in this process; worker processes fill their own copy via load_models
+_loaded_models = {}
+
+# Column order expected by the crop recommendation scaler
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Request fields each model actually reads; anything else cannot change its prediction
+MODEL_INPUT_FIELDS = {
+    "crop": CROP_FEATURES,
+    "fertilizer": ['nitrogen', 'phosphorous', 'potassium', 'temperature', 'crop_type', 'soil_type'],
+    "yield": ['area', 'annual_rainfall', 'fertilizer', 'pesticide', 'crop', 'state', 'season']
+}
+
+# Category orders used at training time; the position in each list is the encoded value
+SOIL_TYPES = ["Sandy", "Loamy", "Black", "Red", "Clayey"]
+FERTILIZER_CROP_TYPES = [
+    "Maize", "Sugarcane", "Cotton", "Tobacco", "Paddy",
+    "Barley", "Wheat", "Millets", "Oil seeds", "Pulses",
+    "Ground Nuts"
+]
+YIELD_CROPS = ["Rice", "Wheat", "Maize", "Sugarcane", "Cotton"]
+SEASONS = ["Kharif", "Rabi", "Summer", "Whole Year"]
+STATES = [
+    "Andhra Pradesh", "Karnataka", "Maharashtra", "Tamil Nadu",
+    "Uttar Pradesh", "West Bengal", "Gujarat", "Madhya Pradesh",
+    "Punjab", "Haryana"
+]
+
+# Fertilizer model defaults for readings the request does not carry
+DEFAULT_FERTILIZER_PH = 7.0
+DEFAULT_FERTILIZER_RAINFALL = 200.0
+
+
+def encode_column(values, categories: list) -> np.ndarray:
+    """
+    Encode a whole column of labels against a fixed category order
+    Unknown labels fall back to code 0, matching the old dict.get(label, 0) lookups
+    """
+    # get_indexer returns -1 for labels outside the categories
+    codes = pd.Index(categories).get_indexer(pd.Index(values, dtype=object))
+    return np.where(codes < 0, 0, codes).astype(float)
+
+
+def build_fertilizer_features(columns, scaler) -> np.ndarray:
+    """
+    Assemble the scaled (n, 8) fertilizer matrix from columnar input
+    `columns` maps request field names to equal-length sequences (a DataFrame works)
+    """
+    columns = pd.DataFrame(columns)
+    features = np.empty((len(columns), 8), dtype=float)
+    features[:, 0] = columns['nitrogen']
+    features[:, 1] = columns['phosphorous']
+    features[:, 2] = columns['potassium']
+    features[:, 3] = DEFAULT_FERTILIZER_PH
+    features[:, 4] = DEFAULT_FERTILIZER_RAINFALL
+    features[:, 5] = columns['temperature']
+    features[:, 6] = encode_column(columns['crop_type'], FERTILIZER_CROP_TYPES)
+    features[:, 7] = encode_column(columns['soil_type'], SOIL_TYPES)
+
+    # Scale only numerical features (first 6)
+    features[:, :6] = scaler.transform(features[:, :6])
+    return features
+
+
+def build_yield_features(columns, scaler) -> np.ndarray:
+    """
+    Assemble the scaled (n, 7) yield matrix from columnar input:
+    area, rainfall, fertilizer, pesticide, then crop, state and season codes
+    """
+    columns = pd.DataFrame(columns)
+    features = np.empty((len(columns), 7), dtype=float)
+    features[:, 0] = columns['area']
+    features[:, 1] = columns['annual_rainfall']
+    features[:, 2] = columns['fertilizer']
+    features[:, 3] = columns['pesticide']
+    features[:, 4] = encode_column(columns['crop'], YIELD_CROPS)
+    features[:, 5] = encode_column(columns['state'], STATES)
+    features[:, 6] = encode_column(columns['season'], SEASONS)
+
+    # Scale only numerical features (first 4)
+    features[:, :4] = scaler.transform(features[:, :4])
+    return features
+
+
+def stack_base_predictions(base_models: dict, features_scaled: np.ndarray) -> np.ndarray:
+    """Run each base model once over the full matrix and stack the outputs column-wise"""
+    return np.column_stack([model.predict(features_scaled) for model in base_models.values()])
+
+
+def summarize_votes(base_predictions: np.ndarray, label_encoder=None, label_key: str = "crop",
+                    max_alternatives: int = 3):
+    """
+    Compute the per-row vote share of the most common base prediction
+    and the runner-up classes, decoding every distinct class label only once
+    """
+    n_rows, n_models = base_predictions.shape
+
+    # agreement[i, j] = number of base models agreeing with model j on row i
+    agreement = (base_predictions[:, :, None] == base_predictions[:, None, :]).sum(axis=2)
+    confidence = agreement.max(axis=1) / n_models * 100
+
+    alternatives = [[] for _ in range(n_rows)]
+    if label_encoder is None or max_alternatives <= 0:
+        return confidence, alternatives
+
+    classes, codes = np.unique(base_predictions.ravel(), return_inverse=True)
+    codes = codes.reshape(n_rows, n_models)
+    try:
+        class_names = label_encoder.inverse_transform(classes)
+    except Exception:
+        return confidence, alternatives
+
+    for i in range(n_rows):
+        ranked = Counter(codes[i].tolist()).most_common()
+        alternatives[i] = [
+            {
+                label_key: class_names[code],
+                "confidence": round(count / n_models * 100, 2)
+            }
+            for code, count in ranked[1:max_alternatives + 1]
+        ]
+    return confidence, alternatives
+
+
+def summarize_probabilities(probabilities: np.ndarray, class_names, label_key: str = "crop",
+                            max_alternatives: int = 3):
+    """
+    Top-k over the meta-model's (n, classes) probability matrix
+    Returns (predicted names, confidence in percent, alternatives); argpartition keeps
+    the per-row cost at O(classes) and only the k survivors are sorted
+    """
+    class_names = np.asarray(class_names, dtype=object)
+    k = max(1, min(max_alternatives + 1, probabilities.shape[1]))
+    candidates = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    scores = np.take_along_axis(probabilities, candidates, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    ranked = np.take_along_axis(candidates, order, axis=1)
+    percent = np.round(np.take_along_axis(scores, order, axis=1) * 100, 2)
+
+    names = class_names[ranked].tolist()
+    percent_rows = percent.tolist()
+    alternatives = [
+        [
+            {label_key: name, "confidence": value}
+            for name, value in zip(row_names[1:], row_percent[1:])
+            if value > 0
+        ]
+        for row_names, row_percent in zip(names, percent_rows)
+    ]
+    predicted = class_names[ranked[:, 0]]
+    confidence = probabilities[np.arange(len(probabilities)), ranked[:, 0]] * 100
+    return predicted, confidence, alternatives
+
+
+def predict_crop_batch(model_data: dict, features: np.ndarray):
+    """
+    Run the crop recommendation stack over an (n, 7) matrix of raw readings
+    Returns (crop names, confidence, alternatives) aligned with the input rows.
+    Confidence and alternatives come from the meta-model's predict_proba, which also
+    decides the crop; meta-models without probabilities fall back to base-model votes
+    """
+    scaler = model_data['scaler']
+    label_encoder = model_data['label_encoder']
+    base_models = model_data['base_models']
+    meta_model = model_data['meta_model']
+
+    features_scaled = scaler.transform(features)
+    base_predictions = stack_base_predictions(base_models, features_scaled)
+
+    if hasattr(meta_model, 'predict_proba'):
+        probabilities = meta_model.predict_proba(base_predictions)
+        # Columns follow meta_model.classes_, which hold label-encoder codes
+        class_names = label_encoder.inverse_transform(meta_model.classes_.astype(int))
+        return summarize_probabilities(probabilities, class_names)
+
+    final_predictions = meta_model.predict(base_predictions)
+    recommended_crops = label_encoder.inverse_transform(final_predictions)
+    confidence, alternatives = summarize_votes(base_predictions, label_encoder)
+    return recommended_crops, confidence, alternatives
+
+
+def predict_fertilizer_batch(model_data: dict, features_scaled: np.ndarray):
+    """
+    Run the fertilizer stack over a matrix from build_fertilizer_features
+    Returns (fertilizer names, vote-share confidence) aligned with the input rows
+    """
+    fertilizer_encoder = model_data['fertilizer_encoder']
+    base_predictions = stack_base_predictions(model_data['base_models'], features_scaled)
+    final_predictions = model_data['meta_model'].predict(base_predictions)
+    recommended_fertilizers = fertilizer_encoder.inverse_transform(final_predictions)
+
+    confidence, _ = summarize_votes(base_predictions, max_alternatives=0)
+    return recommended_fertilizers, confidence
+
+
+def predict_yield_batch(model_data: dict, features_scaled: np.ndarray) -> np.ndarray:
+    """Run the yield regression stack over a matrix from build_yield_features"""
+    base_predictions = stack_base_predictions(model_data['base_models'], features_scaled)
+    return model_data['meta_model'].predict(base_predictions)
+
+
+def load_models(models_dir: str) -> dict:
+    """
+    Load every ensemble bundle found in models_dir into this process's registry
+    Also used as the initializer of inference worker processes
+    """
+    for kind, filename in MODEL_FILES.items():
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            _loaded_models[kind] = joblib.load(path)
+    return dict(_loaded_models)
+
+
+def run_crop_inference(features: np.ndarray):
+    """Executor entry point: crop stack over raw readings using the process-local models"""
+    return predict_crop_batch(_loaded_models['crop'], features)
+
+
+def run_fertilizer_inference(columns):
+    """Executor entry point: build fertilizer features and run the stack"""
+    model_data = _loaded_models['fertilizer']
+    features_scaled = build_fertilizer_features(columns, model_data['scaler'])
+    return predict_fertilizer_batch(model_data, features_scaled)
+
+
+def run_yield_inference(columns) -> np.ndarray:
+    """Executor entry point: build yield features and run the stack"""
+    model_data = _loaded_models['yield']
+    features_scaled = build_yield_features(columns, model_data['scaler'])
+    return predict_yield_batch(model_data, features_scaled)
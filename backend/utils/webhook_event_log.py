@@ -0,0 +1,248 @@
+"""
+Append-only, queryable log of received webhook events
+Events go to SQLite in WAL mode through a single writer thread that commits in
+batches, so ingest never waits on disk and readers never block the writer
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at TEXT NOT NULL,
+    received_ts REAL NOT NULL,
+    event_type TEXT,
+    plant TEXT,
+    disease TEXT,
+    severity TEXT,
+    confidence REAL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_time ON events (received_ts);
+DROP INDEX IF EXISTS idx_events_plant;
+DROP INDEX IF EXISTS idx_events_disease;
+DROP INDEX IF EXISTS idx_events_severity;
+CREATE INDEX IF NOT EXISTS idx_events_plant_id ON events (plant, id);
+CREATE INDEX IF NOT EXISTS idx_events_disease_id ON events (disease, id);
+CREATE INDEX IF NOT EXISTS idx_events_severity_id ON events (severity, id);
+"""
+
+# Sentinel telling the writer thread to flush and exit
+_STOP = object()
+
+
+def as_object(value) -> dict:
+    """`value` if it is a JSON object, else an empty dict; nested payload fields are not trusted"""
+    return value if isinstance(value, dict) else {}
+
+
+def _event_fields(payload: dict) -> tuple:
+    """Indexed columns for a payload; plot alerts carry a summary instead of one prediction"""
+    payload = as_object(payload)
+    prediction = as_object(payload.get("prediction"))
+    summary = as_object(payload.get("summary"))
+    return (
+        payload.get("event_type"),
+        prediction.get("plant"),
+        prediction.get("disease"),
+        prediction.get("severity") or summary.get("max_severity"),
+        _as_float(prediction.get("confidence"))
+    )
+
+
+def _as_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_timestamp(value) -> float:
+    """Accept epoch seconds or an ISO 8601 string"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+class WebhookEventLog:
+    """
+    `append` only queues the event; the writer thread commits up to
+    batch_size events per transaction. Queries open their own read connection
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._written = 0
+        self._failed = 0
+        self._last_error = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="webhook-event-log", daemon=True)
+            self._writer.start()
+
+    def close(self):
+        """Flush queued events and stop the writer"""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+    def append(self, payload: dict, received_at: datetime):
+        self._queue.put((received_at, payload))
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = _STOP in batch
+                events = [item for item in batch if item is not _STOP]
+                try:
+                    self._insert(conn, events)
+                except Exception as e:
+                    # One bad batch must not stop the logger; drop it and keep going
+                    conn.rollback()
+                    self._failed += len(events)
+                    self._last_error = str(e)
+                    print(f"⚠ Failed to write {len(events)} webhook events: {e}")
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _insert(self, conn: sqlite3.Connection, events: list):
+        rows = [
+            (received_at.isoformat(), received_at.timestamp(), *_event_fields(payload),
+             json.dumps(payload, default=str))
+            for received_at, payload in events
+        ]
+        if rows:
+            conn.executemany(
+                "INSERT INTO events (received_at, received_ts, event_type, plant, disease, "
+                "severity, confidence, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+            self._written += len(rows)
+
+    @staticmethod
+    def _first_id_at(conn: sqlite3.Connection, timestamp: float):
+        """Id of the first event received at or after `timestamp`, or None"""
+        row = conn.execute(
+            "SELECT id FROM events WHERE received_ts >= ? ORDER BY received_ts, id LIMIT 1", (timestamp,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def query(self, limit: int = 10, cursor: int = None, start=None, end=None,
+              plant: str = None, disease: str = None, severity: str = None) -> dict:
+        """
+        Newest-first page of events matching the filters. `cursor` is the
+        next_cursor of the previous page (an event id); pages are keyset-based
+        so deep pages cost the same as the first.
+
+        Every plan walks id in descending order: the column filters use their
+        (column, id) index, and a time range is first turned into an id range
+        with the received_ts index (ids are assigned in arrival order)
+        """
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        for column, value in (("plant", plant), ("disease", disease), ("severity", severity)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+
+        conn = self._connect()
+        try:
+            if start is not None:
+                start_ts = _to_timestamp(start)
+                start_id = self._first_id_at(conn, start_ts)
+                # No start_id means nothing arrived at or after `start`
+                clauses.append("id >= ?" if start_id is not None else "0")
+                if start_id is not None:
+                    params.append(start_id)
+                # Exact check kept; unary + stops SQLite from choosing the time index for it
+                clauses.append("+received_ts >= ?")
+                params.append(start_ts)
+            if end is not None:
+                end_ts = _to_timestamp(end)
+                end_id = self._first_id_at(conn, end_ts)
+                if end_id is not None:
+                    clauses.append("id < ?")
+                    params.append(end_id)
+                clauses.append("+received_ts < ?")
+                params.append(end_ts)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(
+                f"SELECT id, received_at, payload FROM events {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "events": [
+                {"id": row_id, "received_at": received_at, "payload": json.loads(payload)}
+                for row_id, received_at, payload in rows
+            ],
+            "next_cursor": rows[-1][0] if has_more and rows else None
+        }
+
+    def count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        finally:
+            conn.close()
+
+    def clear(self) -> int:
+        conn = self._connect()
+        try:
+            deleted = conn.execute("DELETE FROM events").rowcount
+            conn.commit()
+            return deleted
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "written": self._written,
+            "failed": self._failed,
+            "last_error": self._last_error,
+            "queued": self._queue.qsize()
+        }
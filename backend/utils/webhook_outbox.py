@@ -0,0 +1,184 @@
+"""
+Durable outbox for webhook alerts
+Alerts are committed to a local SQLite file and drained by a background worker,
+so they survive restarts and a slow or unreachable receiver never blocks a request
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WebhookOutbox:
+    """
+    `send_batch` is an async callable taking a list of payloads and returning a list
+    of booleans (delivered or not) in the same order. Undelivered alerts are retried
+    with exponential backoff; after max_attempts they are kept on disk as 'dead'
+    """
+
+    def __init__(self, path: str, send_batch, batch_size: int = 50, linger_ms: float = 250.0,
+                 base_backoff: float = 1.0, max_backoff: float = 300.0, max_attempts: int = 20):
+        self.path = path
+        self.send_batch = send_batch
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger_ms) / 1000.0
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+
+        # All SQLite access goes through one thread so the connection is never shared
+        self._db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-outbox")
+        self._conn = None
+        self._wakeup = None
+        self._worker = None
+
+        self._delivered = 0
+        self._failed_attempts = 0
+        self._posts = 0
+        self._last_error = None
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_thread, fn, *args)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+        conn.commit()
+        self._conn = conn
+
+    async def start(self):
+        """Open the outbox file and start draining, including alerts left from a previous run"""
+        if self._worker is None:
+            await self._db(self._open)
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._drain(), name="webhook-outbox")
+            pending = await self._db(self._count, 'pending')
+            if pending:
+                print(f"✓ Webhook outbox resuming with {pending} pending alerts")
+
+    async def close(self):
+        """Stop the worker; undelivered alerts stay on disk for the next start"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._conn is not None:
+            await self._db(self._conn.close)
+            self._conn = None
+        self._db_thread.shutdown(wait=True)
+
+    def _insert(self, payloads: list):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+            [(json.dumps(payload, default=str), now, now) for payload in payloads]
+        )
+        self._conn.commit()
+
+    async def enqueue(self, payload: dict):
+        """Commit one alert to the outbox and wake the worker"""
+        await self._db(self._insert, [payload])
+        self._wakeup.set()
+
+    def _due(self, limit: int) -> list:
+        return self._conn.execute(
+            "SELECT id, payload, attempts FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY id LIMIT ?",
+            (time.time(), limit)
+        ).fetchall()
+
+    def _next_due_in(self):
+        row = self._conn.execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _settle(self, delivered_ids: list, failed: list, error: str):
+        self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in delivered_ids])
+        now = time.time()
+        for row_id, attempts in failed:
+            attempts += 1
+            if self.max_attempts and attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE outbox SET attempts = ?, status = 'dead', last_error = ? WHERE id = ?",
+                    (attempts, error, row_id)
+                )
+                continue
+            # Jitter keeps many replicas from retrying in lockstep
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, now + random.uniform(delay / 2, delay), error, row_id)
+            )
+        self._conn.commit()
+
+    def _count(self, status: str) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (status,)).fetchone()[0]
+
+    async def _drain(self):
+        while True:
+            rows = await self._db(self._due, self.batch_size)
+            if not rows:
+                self._wakeup.clear()
+                wait = await self._db(self._next_due_in)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                # Give alerts arriving in a burst a moment to share the next POST
+                if self.linger:
+                    await asyncio.sleep(self.linger)
+                continue
+
+            payloads = [json.loads(payload) for _, payload, _ in rows]
+            error = None
+            try:
+                results = await self.send_batch(payloads)
+            except Exception as e:
+                results = [False] * len(rows)
+                error = str(e)
+            self._posts += 1
+
+            delivered = [row_id for (row_id, _, _), ok in zip(rows, results) if ok]
+            failed = [(row_id, attempts) for (row_id, _, attempts), ok in zip(rows, results) if not ok]
+            if failed:
+                error = error or "delivery failed"
+                self._failed_attempts += len(failed)
+                self._last_error = error
+            self._delivered += len(delivered)
+            await self._db(self._settle, delivered, failed, error)
+
+    async def stats(self) -> dict:
+        pending = await self._db(self._count, 'pending') if self._conn is not None else 0
+        dead = await self._db(self._count, 'dead') if self._conn is not None else 0
+        return {
+            "path": self.path,
+            "pending": pending,
+            "dead": dead,
+            "delivered": self._delivered,
+            "failed_attempts": self._failed_attempts,
+            "posts": self._posts,
+            "last_error": self._last_error
+        }
@@ -0,0 +1,309 @@
+"""
+Write-behind persistence for prediction records
+Handlers hand records to an in-memory queue and return; a background task flushes
+them with insert_many(ordered=False) every flush interval or batch size, whichever
+comes first. Records that cannot be written (queue full, MongoDB down) are spilled
+to a JSON-lines file and replayed once the database accepts writes again
+"""
+import asyncio
+import copy
+import glob
+import os
+import time
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindWriter:
+    """
+    Buffers (collection, document) pairs for one database. Documents get their _id
+    when queued, so a replay after a partial write only hits duplicate-key errors,
+    which are treated as already written
+    """
+
+    def __init__(self, db, flush_interval_ms: float = 50.0, batch_size: int = 500, max_queue: int = 10000,
+                 spill_path: str = None, replay_interval_seconds: float = 5.0):
+        self.db = db
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.batch_size = max(1, batch_size)
+        self.max_queue = max(1, max_queue)
+        self.spill_path = spill_path
+        self.replay_interval = replay_interval_seconds
+
+        self._queue = None
+        self._task = None
+        # Batch being collected by the flusher, still visible to discard()
+        self._collecting = []
+        # Held while a flush or replay has documents discard() cannot reach
+        self._lock = asyncio.Lock()
+        self._closing = False
+
+        self._written = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._failed_flushes = 0
+        self._dropped = 0
+        self._quarantined = 0
+        self._last_error = None
+
+    def start(self):
+        if self._task is None:
+            self._recover_replays()
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    async def close(self):
+        """Stop the flusher and write out everything still queued (spilling it if MongoDB is down)"""
+        if self._task is not None:
+            # Taking the lock first means the flusher is never cancelled in the middle of a write.
+            # The flag covers a cancel lost inside wait_for: the flusher then stops at the lock
+            async with self._lock:
+                self._closing = True
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        async with self._lock:
+            pending, self._collecting = self._collecting, []
+            while self._queue is not None and not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            for start in range(0, len(pending), self.batch_size):
+                await self._flush(pending[start:start + self.batch_size])
+        if pending:
+            print(f"✓ Flushed {len(pending)} queued prediction records on shutdown")
+
+    def submit(self, collection_name: str, records: list):
+        """Queue records without waiting; spills to disk instead of blocking when the queue is full"""
+        overflow = []
+        for record in records:
+            # The caller's dict gets the same _id, so the history cache can match the two up
+            record.setdefault("_id", ObjectId())
+            # Snapshot: the caller may keep changing its dict
+            document = copy.deepcopy(record)
+            try:
+                self._queue.put_nowait((collection_name, document))
+            except asyncio.QueueFull:
+                overflow.append((collection_name, document))
+        if overflow:
+            self._spill(overflow)
+
+    async def _run(self):
+        while True:
+            try:
+                if not await self._step():
+                    return
+            except Exception as e:
+                # One bad flush or replay must not stop persistence for good
+                self._last_error = str(e)
+                print(f"⚠ Write-behind flusher error, continuing: {e!r}")
+
+    async def _step(self) -> bool:
+        """Collect and write one batch, or replay the spill file when idle; False once closing"""
+        loop = asyncio.get_running_loop()
+        # Idle with spilled records on disk: retry them periodically
+        idle_timeout = self.replay_interval if self._has_spill() else None
+        try:
+            first = await asyncio.wait_for(self._queue.get(), idle_timeout)
+        except asyncio.TimeoutError:
+            async with self._lock:
+                if self._closing:
+                    return False
+                if self._has_spill():
+                    await self._replay()
+            return True
+
+        self._collecting = [first]
+        deadline = loop.time() + self.flush_interval
+        while len(self._collecting) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._collecting.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        async with self._lock:
+            if self._closing:
+                # close() flushes what was collected
+                return False
+            batch, self._collecting = self._collecting, []
+            if batch and await self._flush(batch) and self._has_spill():
+                await self._replay()
+        return True
+
+    async def _flush(self, batch: list) -> bool:
+        """Insert a batch grouped by collection; returns False if anything had to be spilled"""
+        by_collection = {}
+        for collection_name, document in batch:
+            by_collection.setdefault(collection_name, []).append(document)
+
+        ok = True
+        for collection_name, documents in by_collection.items():
+            try:
+                await self.db[collection_name].insert_many(documents, ordered=False)
+                self._written += len(documents)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                failed = [documents[err["index"]] for err in errors if err.get("code") != DUPLICATE_KEY]
+                self._written += len(documents) - len(failed)
+                if failed:
+                    ok = False
+                    self._record_failure(e)
+                    self._spill([(collection_name, document) for document in failed])
+            except Exception as e:
+                ok = False
+                self._record_failure(e)
+                self._spill([(collection_name, document) for document in documents])
+        return ok
+
+    def _record_failure(self, error: Exception):
+        self._failed_flushes += 1
+        self._last_error = str(error)
+        print(f"⚠ Prediction write failed, spilling to disk: {error}")
+
+    async def discard(self, user_id: str, collections: list = None) -> int:
+        """
+        Drop a user's records that are not in MongoDB yet (queued or spilled), e.g.
+        before deleting their history, so they cannot be inserted after the delete.
+        Waits for a flush or replay in progress to finish first
+        """
+        def matches(item) -> bool:
+            collection_name, document = item
+            return document.get("userId") == user_id and (collections is None or collection_name in collections)
+
+        async with self._lock:
+            collecting = len(self._collecting)
+            self._collecting[:] = [item for item in self._collecting if not matches(item)]
+            dropped = collecting - len(self._collecting)
+
+            queued = []
+            while self._queue is not None and not self._queue.empty():
+                queued.append(self._queue.get_nowait())
+            kept = [item for item in queued if not matches(item)]
+            dropped += len(queued) - len(kept)
+            for item in kept:
+                self._queue.put_nowait(item)
+
+            if self._has_spill():
+                entries = self._read_spill(self.spill_path)
+                remaining = [line for line, item in entries if not matches(item)]
+                dropped += len(entries) - len(remaining)
+                if remaining:
+                    with open(self.spill_path, "w", encoding="utf-8") as f:
+                        f.writelines(remaining)
+                else:
+                    os.remove(self.spill_path)
+        return dropped
+
+    def _recover_replays(self):
+        """Fold replay files left by a crash mid-replay back into the spill file"""
+        if not self.spill_path:
+            return
+        for replay_path in sorted(glob.glob(f"{glob.escape(self.spill_path)}.*.replay")):
+            # Records already written by the interrupted replay come back as duplicate keys
+            with open(replay_path, "r", encoding="utf-8") as f:
+                _append_lines(self.spill_path, f.readlines())
+            os.remove(replay_path)
+            print(f"✓ Recovered interrupted replay {os.path.basename(replay_path)}")
+
+    def _has_spill(self) -> bool:
+        return bool(self.spill_path) and os.path.exists(self.spill_path)
+
+    def _spill(self, items: list):
+        if not self.spill_path:
+            self._dropped += len(items)
+            print(f"⚠ Dropping {len(items)} prediction records (no spill file configured)")
+            return
+        try:
+            _append_lines(self.spill_path, [
+                json_util.dumps({"collection": collection_name, "document": document}) + "\n"
+                for collection_name, document in items
+            ])
+        except OSError as e:
+            # Disk full or unwritable: callers must not fail because persistence did
+            self._dropped += len(items)
+            self._last_error = str(e)
+            print(f"⚠ Dropping {len(items)} prediction records, spill file not writable: {e}")
+            return
+        self._spilled += len(items)
+
+    def _read_spill(self, path: str) -> list:
+        """
+        (line, (collection, document)) for each record in a spill file. Lines that do
+        not parse, e.g. one cut short by a crash or a full disk, are moved to
+        {spill_path}.bad instead of stopping the replay
+        """
+        entries, bad = [], []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json_util.loads(line)
+                    collection_name, document = entry["collection"], entry["document"]
+                    if not isinstance(collection_name, str) or not isinstance(document, dict):
+                        raise ValueError("not a spilled record")
+                except (ValueError, KeyError, TypeError):
+                    bad.append(line)
+                    continue
+                entries.append((line if line.endswith("\n") else line + "\n", (collection_name, document)))
+        if bad:
+            try:
+                _append_lines(f"{self.spill_path}.bad", bad)
+            except OSError as e:
+                print(f"⚠ Could not keep unreadable spill lines: {e}")
+            self._quarantined += len(bad)
+            print(f"⚠ Moved {len(bad)} unreadable spill lines to {os.path.basename(self.spill_path)}.bad")
+        return entries
+
+    async def _replay(self):
+        """
+        Move the spill file aside and push its records through the normal flush path.
+        The moved file is only removed once every chunk was either written or
+        re-spilled, so a crash mid-replay leaves it to be picked up on restart
+        """
+        replay_path = f"{self.spill_path}.{int(time.time() * 1000)}.replay"
+        os.replace(self.spill_path, replay_path)
+        items = [item for _, item in self._read_spill(replay_path)]
+
+        spilled_before = self._spilled
+        for start in range(0, len(items), self.batch_size):
+            # Failed chunks go back to the spill file via _flush
+            await self._flush(items[start:start + self.batch_size])
+        os.remove(replay_path)
+        recovered = len(items) - (self._spilled - spilled_before)
+        self._replayed += recovered
+        if recovered:
+            print(f"✓ Replayed {recovered} spilled prediction records")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "written": self._written,
+            "spilled": self._spilled,
+            "replayed": self._replayed,
+            "failed_flushes": self._failed_flushes,
+            "dropped": self._dropped,
+            "quarantined": self._quarantined,
+            "spill_pending": self._has_spill(),
+            "last_error": self._last_error
+        }
+
+
+def _append_lines(path: str, lines: list):
+    """Append whole lines, starting on a fresh line if the file ends in a partial one"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a+b") as f:
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.write("".join(line if line.endswith("\n") else line + "\n" for line in lines).encode("utf-8"))